@@ -0,0 +1,183 @@
+"""
+Log Aggregator - Admission Control
+Backpressure berdasarkan kedalaman queue dan waktu tunggu connection pool
+"""
+import itertools
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class WaitTracker:
+    """
+    Waktu tunggu pool.acquire() dalam sliding window.
+    
+    Nilai saat ini adalah rata-rata wait yang selesai di dalam window, atau
+    umur wait tertua yang masih berjalan jika lebih besar (pool yang macet
+    tetap terdeteksi walaupun belum ada acquire yang selesai). Tanpa sampel
+    di dalam window nilainya 0, sehingga state kembali normal setelah beban
+    turun.
+    """
+    
+    def __init__(self, window_seconds: float = 5.0):
+        self._window = window_seconds
+        self._samples: Deque[Tuple[float, float]] = deque()
+        self._pending: Dict[int, float] = {}
+        self._tokens = itertools.count()
+    
+    def start(self) -> int:
+        token = next(self._tokens)
+        self._pending[token] = time.monotonic()
+        return token
+    
+    def finish(self, token: int) -> None:
+        started = self._pending.pop(token, None)
+        if started is not None:
+            now = time.monotonic()
+            self._samples.append((now, now - started))
+    
+    def current_ms(self) -> float:
+        now = time.monotonic()
+        while self._samples and self._samples[0][0] < now - self._window:
+            self._samples.popleft()
+        average = sum(wait for _, wait in self._samples) / len(self._samples) if self._samples else 0.0
+        oldest = now - min(self._pending.values()) if self._pending else 0.0
+        return max(average, oldest) * 1000
+
+
+class Watermark:
+    """Hysteresis: aktif saat nilai >= high, kembali normal saat nilai <= low"""
+    
+    def __init__(self, high: float, low: float):
+        self.high = high
+        self.low = low
+        self.active = False
+        self.value = 0.0
+    
+    def update(self, value: float) -> bool:
+        self.value = value
+        if not self.active and value >= self.high:
+            self.active = True
+        elif self.active and value <= self.low:
+            self.active = False
+        return self.active
+    
+    def describe(self) -> Dict[str, Any]:
+        return {'value': self.value, 'high': self.high, 'low': self.low, 'shedding': self.active}
+
+
+class AdmissionController:
+    """
+    Admission control untuk endpoint publish.
+    
+    - Queue depth (/publish/queue*): di atas high watermark request ditolak
+      429 sampai queue turun ke low watermark. Retry-After dihitung dari laju
+      drain queue yang teramati.
+    - Pool wait (/publish, /publish/batch, /publish/bulk): jika rata-rata
+      waktu tunggu connection pool di atas high watermark, request ditolak
+      503 sampai turun ke low watermark. Retry-After sebanding dengan wait.
+    
+    Kedalaman queue di-sample paling sering sekali per sample_interval_seconds
+    sehingga pengecekan tidak menambah round trip Redis per request.
+    """
+    
+    def __init__(
+        self,
+        queue_size: Callable[[], Awaitable[int]],
+        pool_wait: WaitTracker,
+        queue_high: int,
+        queue_low: int,
+        pool_wait_high_ms: float,
+        pool_wait_low_ms: float,
+        sample_interval_seconds: float = 0.5,
+        retry_after_max_seconds: int = 30
+    ):
+        self._queue_size = queue_size
+        self._pool_wait = pool_wait
+        self.queue = Watermark(queue_high, queue_low)
+        self.pool = Watermark(pool_wait_high_ms, pool_wait_low_ms)
+        self._sample_interval = sample_interval_seconds
+        self._retry_after_max = retry_after_max_seconds
+        self._last_sample: Optional[Tuple[float, int]] = None
+        # Event per detik yang keluar dari queue (EWMA, hanya saat queue turun)
+        self._drain_rate = 0.0
+        self.rejected_queue = 0
+        self.rejected_pool = 0
+    
+    async def _sample_queue(self) -> None:
+        now = time.monotonic()
+        if self._last_sample and now - self._last_sample[0] < self._sample_interval:
+            return
+        previous = self._last_sample
+        # Tandai lebih dulu agar request konkuren tidak ikut sampling
+        self._last_sample = (now, previous[1] if previous else 0)
+        try:
+            depth = await self._queue_size()
+        except Exception as e:
+            logger.warning(f"Admission control failed to sample queue depth: {e}")
+            return
+        if previous and depth < previous[1]:
+            rate = (previous[1] - depth) / (now - previous[0])
+            self._drain_rate = rate if not self._drain_rate else 0.7 * self._drain_rate + 0.3 * rate
+        self._last_sample = (now, depth)
+        was_shedding = self.queue.active
+        if self.queue.update(depth) != was_shedding:
+            logger.warning(f"Queue admission {'shedding' if self.queue.active else 'recovered'} at depth {depth}")
+    
+    def _clamp(self, seconds: float) -> int:
+        return max(1, min(self._retry_after_max, math.ceil(seconds)))
+    
+    async def check_queue(self) -> Optional[int]:
+        """None jika request diterima, selain itu Retry-After (detik)"""
+        await self._sample_queue()
+        if not self.queue.active:
+            return None
+        self.rejected_queue += 1
+        if self._drain_rate <= 0:
+            return self._retry_after_max
+        return self._clamp((self.queue.value - self.queue.low) / self._drain_rate)
+    
+    def _refresh_pool(self) -> bool:
+        was_shedding = self.pool.active
+        wait_ms = self._pool_wait.current_ms()
+        if self.pool.update(wait_ms) != was_shedding:
+            logger.warning(f"Pool admission {'shedding' if self.pool.active else 'recovered'} at {wait_ms:.0f} ms wait")
+        return self.pool.active
+    
+    def check_pool(self) -> Optional[int]:
+        """None jika request diterima, selain itu Retry-After (detik)"""
+        if not self._refresh_pool():
+            return None
+        self.rejected_pool += 1
+        # Perkiraan kasar: backlog pool butuh beberapa kali wait saat ini untuk terurai
+        return self._clamp(2 * self.pool.value / 1000)
+    
+    async def refresh(self) -> None:
+        """Perbarui kedua sinyal tanpa menghitung request (untuk /health dan /stats)"""
+        await self._sample_queue()
+        self._refresh_pool()
+    
+    @property
+    def state(self) -> str:
+        if self.queue.active and self.pool.active:
+            return "shedding"
+        if self.queue.active:
+            return "shedding_queue"
+        if self.pool.active:
+            return "shedding_pool"
+        return "open"
+    
+    def metrics(self) -> Dict[str, Any]:
+        """State admission control untuk /stats"""
+        return {
+            'state': self.state,
+            'queue_depth': self.queue.describe(),
+            'pool_wait_ms': self.pool.describe(),
+            'queue_drain_rate': self._drain_rate,
+            'rejected_queue': self.rejected_queue,
+            'rejected_pool': self.rejected_pool
+        }
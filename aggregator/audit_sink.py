@@ -0,0 +1,123 @@
+"""
+Log Aggregator - Buffered Audit Log Writer
+Menampung audit record di memory dan menulisnya ke audit_log secara batch
+"""
+import asyncio
+import logging
+import random
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (operation, topic, event_id, details, created_at)
+AuditRecord = Tuple[str, str, str, Dict[str, Any], datetime]
+
+
+class AuditSink:
+    """
+    Buffered audit writer untuk tabel audit_log.
+    
+    Audit record dicatat setelah transaction event commit, sehingga transaction
+    ingest hanya berisi pekerjaan yang kritis untuk deduplication. Record
+    di-flush dengan satu multi-row insert setiap flush_interval_ms atau ketika
+    buffer mencapai flush_max_records. Record DUPLICATE dapat di-sample.
+    
+    Audit bersifat best-effort: record yang belum di-flush hilang jika proses
+    crash, dan record tertua dibuang jika buffer penuh (database tidak tersedia).
+    """
+    
+    def __init__(
+        self,
+        write_func: Callable[[List[AuditRecord]], Awaitable[None]],
+        flush_interval_ms: int = 1000,
+        flush_max_records: int = 500,
+        buffer_max_records: int = 100000,
+        duplicate_sample_rate: float = 1.0
+    ):
+        self._write_func = write_func
+        self._flush_interval = flush_interval_ms / 1000
+        self._flush_max_records = flush_max_records
+        self._duplicate_sample_rate = duplicate_sample_rate
+        self._buffer: Deque[AuditRecord] = deque(maxlen=buffer_max_records)
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+        self.recorded: Dict[str, int] = {}
+    
+    def start(self) -> None:
+        """Start background flush loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+            logger.info("Audit sink started")
+    
+    async def stop(self) -> None:
+        """Stop flush loop dan flush sisa record"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info("Audit sink stopped")
+    
+    def record(
+        self,
+        operation: str,
+        topic: str,
+        event_id: str,
+        details: Dict[str, Any]
+    ) -> None:
+        """Tambahkan audit record ke buffer (DUPLICATE di-sample)"""
+        if operation == 'DUPLICATE' and random.random() >= self._duplicate_sample_rate:
+            return
+        
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self.recorded[operation] = self.recorded.get(operation, 0) + 1
+        self._buffer.append((operation, topic, event_id, details, datetime.now(timezone.utc)))
+        
+        if len(self._buffer) >= self._flush_max_records:
+            self._wake.set()
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Jumlah record per operation (setelah sampling), buffer dan dropped"""
+        return {
+            "recorded": dict(self.recorded),
+            "buffered": len(self._buffer),
+            "dropped": self.dropped,
+            "duplicate_sample_rate": self._duplicate_sample_rate,
+        }
+    
+    def discard(self) -> None:
+        """Buang record yang belum di-flush"""
+        self._buffer.clear()
+    
+    async def flush(self) -> None:
+        """Tulis seluruh record di buffer ke audit_log"""
+        async with self._lock:
+            while self._buffer:
+                batch = [
+                    self._buffer.popleft()
+                    for _ in range(min(len(self._buffer), self._flush_max_records))
+                ]
+                try:
+                    await self._write_func(batch)
+                except Exception as e:
+                    # Kembalikan ke depan buffer, dicoba lagi pada flush berikutnya
+                    self._buffer.extendleft(reversed(batch))
+                    logger.error(f"Failed to flush audit records: {e}")
+                    return
+    
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
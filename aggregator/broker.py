@@ -3,28 +3,123 @@ Log Aggregator - Redis Broker Module
 Handles message queue operations using Redis
 """
 import redis.asyncio as redis
+import base64
 import json
 import logging
-from typing import Optional, List, Dict, Any, Callable
+import os
+import socket
+import time
+import uuid
+import zlib
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, Callable, Tuple, Union
 from datetime import datetime
 import asyncio
 
+import queue_codec
 from config import get_settings
+from partitions import PartitionAssigner
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+# (message_id, event); message_id None untuk backend list (tidak perlu ack)
+QueuedEvent = Tuple[Optional[str], Dict[str, Any]]
+
+# Pindahkan retry yang sudah jatuh tempo dari sorted set ke queue utama secara
+# atomic (ZREM + push dalam satu script), sehingga aman dijalankan oleh banyak
+# replica sekaligus dan event tidak hilang di antara keduanya.
+# KEYS: retry sorted set, queue tujuan
+# ARGV: now (epoch), limit, backend ("list"/"stream"), stream maxlen
+PROMOTE_RETRIES_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    redis.call('ZREM', KEYS[1], member)
+    if ARGV[3] == 'stream' then
+        redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[4], '*', 'event', member)
+    else
+        redis.call('LPUSH', KEYS[2], member)
+    end
+end
+return #due
+"""
+
+
+# Pindahkan n event tertua (tail) dari queue lama ke queue partisi tujuan
+# secara atomic. Tail diverifikasi lebih dulu, sehingga aman jika beberapa
+# replica men-drain key yang sama bersamaan (script gagal, dibaca ulang).
+# KEYS: queue sumber, queue tujuan per event
+# ARGV: event sesuai LRANGE sumber -n -1 (kiri ke kanan: baru ke lama)
+MOVE_QUEUE_TAIL_SCRIPT = """
+local n = #ARGV
+local tail = redis.call('LRANGE', KEYS[1], -n, -1)
+if #tail ~= n then
+    return 0
+end
+for i = 1, n do
+    if tail[i] ~= ARGV[i] then
+        return 0
+    end
+end
+redis.call('LTRIM', KEYS[1], 0, -n - 1)
+for i = n, 1, -1 do
+    redis.call('LPUSH', KEYS[i + 1], ARGV[i])
+end
+return n
+"""
+
+# Pindahkan member retry sorted set lama ke sorted set partisi tujuan dengan
+# score (waktu jatuh tempo) yang sama; member yang sudah dipindah/dipromosikan
+# proses lain dilewati.
+# KEYS: sorted set sumber, sorted set tujuan per member
+# ARGV: member dan score berselang-seling
+MOVE_RETRIES_SCRIPT = """
+local moved = 0
+for i = 2, #KEYS do
+    local member = ARGV[2 * i - 3]
+    if redis.call('ZREM', KEYS[1], member) == 1 then
+        redis.call('ZADD', KEYS[i], ARGV[2 * i - 2], member)
+        moved = moved + 1
+    end
+end
+return moved
+"""
+
+# Jumlah event/member yang dipindah per script saat drain key partisi lama
+LEGACY_DRAIN_CHUNK = 500
+
+
 class Broker:
     """
     Redis-based message broker untuk event queue.
     Supports at-least-once delivery dengan acknowledgment.
+    
+    Backend default: list (LPUSH/BRPOP). Event yang sudah di-pop hilang jika
+    proses crash sebelum commit; gunakan StreamBroker untuk ack setelah commit.
+    
+    Dengan queue_partitions > 1, event dibagi ke event_queue:<n> berdasarkan
+    hash topic (atau topic/source). Setiap partisi dikonsumsi oleh tepat satu
+    worker (PartitionAssigner), sehingga urutan FIFO per topic terjaga dan
+    throughput bertambah dengan jumlah partisi dan worker.
+    
+    Saat connect, event dan retry yang tertinggal di key partisi lama (setelah
+    queue_partitions diubah) dipindahkan ke partisi yang sesuai.
     """
     
+    backend = "list"
+    
     def __init__(self):
         self.redis: Optional[redis.Redis] = None
+        # Client tanpa decode_responses untuk membaca payload event (biner atau JSON)
+        self.payload_redis: Optional[redis.Redis] = None
         self._connected = False
         self._processing = False
+        self._promote_retries = None
+        self.partitions = max(1, settings.queue_partitions)
+        self._assigner: Optional[PartitionAssigner] = None
+        # Rotasi urutan key BRPOP agar partisi awal tidak selalu didahulukan
+        self._rotation = 0
     
     async def connect(self) -> None:
         """Initialize Redis connection"""
@@ -37,8 +132,26 @@ class Broker:
                 max_connections=settings.redis_max_connections,
                 decode_responses=True
             )
+            self.payload_redis = redis.from_url(
+                settings.broker_url,
+                max_connections=settings.redis_max_connections
+            )
             # Test connection
             await self.redis.ping()
+            # Preload script agar promosi pertama tidak kena NOSCRIPT round trip
+            self._promote_retries = self.redis.register_script(PROMOTE_RETRIES_SCRIPT)
+            await self.redis.script_load(PROMOTE_RETRIES_SCRIPT)
+            if self.partitions > 1:
+                self._assigner = PartitionAssigner(
+                    self.redis,
+                    key_prefix=settings.event_queue_name,
+                    partitions=self.partitions,
+                    heartbeat_seconds=settings.partition_heartbeat_seconds,
+                    member_ttl_seconds=settings.partition_member_ttl_seconds
+                )
+                await self._assigner.preload()
+            if self.backend == "list":
+                await self._drain_legacy_partitions()
             self._connected = True
             logger.info("Redis broker connected")
         except Exception as e:
@@ -50,7 +163,9 @@ class Broker:
         self._processing = False
         if self.redis:
             await self.redis.close()
+            await self.payload_redis.close()
             self.redis = None
+            self.payload_redis = None
             self._connected = False
             logger.info("Redis broker disconnected")
     
@@ -58,14 +173,154 @@ class Broker:
     def is_connected(self) -> bool:
         return self._connected and self.redis is not None
     
+    def partition_of(self, event: Dict[str, Any]) -> int:
+        """Partisi event berdasarkan hash topic (atau topic/source)"""
+        if self.partitions == 1:
+            return 0
+        if settings.queue_partition_key == "topic_source":
+            key = f"{event['topic']}/{event['source']}"
+        else:
+            key = event['topic']
+        return zlib.crc32(key.encode()) % self.partitions
+    
+    def _queue_key(self, partition: int) -> str:
+        """Key Redis queue partisi (tanpa partisi: event_queue)"""
+        if self.partitions == 1:
+            return settings.event_queue_name
+        return f"{settings.event_queue_name}:{partition}"
+    
+    def _retry_key(self, partition: int) -> str:
+        """Key sorted set retry partisi (retry kembali ke partisi yang sama)"""
+        if self.partitions == 1:
+            return settings.retry_queue_name
+        return f"{settings.retry_queue_name}:{partition}"
+    
+    def _is_legacy_key(self, key: str, base: str) -> bool:
+        """Key queue/retry milik konfigurasi partisi lain (tidak dibaca worker saat ini)"""
+        if key == base:
+            return self.partitions > 1
+        suffix = key[len(base) + 1:]
+        return suffix.isdigit() and (self.partitions == 1 or int(suffix) >= self.partitions)
+    
+    async def _legacy_keys(self, base: str) -> List[str]:
+        keys = [base] if self.partitions > 1 else []
+        keys.extend([key async for key in self.redis.scan_iter(match=f"{base}:[0-9]*")])
+        return [key for key in keys if self._is_legacy_key(key, base)]
+    
+    async def _drain_legacy_partitions(self) -> None:
+        """
+        Pindahkan event dan retry dari key partisi lama ke partisi saat ini.
+        Tanpa ini, mengubah queue_partitions meninggalkan event di event_queue
+        (1 -> N) atau di event_queue:k untuk k >= N (N dikurangi) yang tidak
+        pernah dibaca worker lagi.
+        
+        Event dipindah mulai dari yang tertua dan ditambahkan di belakang
+        event yang sudah ada di partisi tujuan.
+        """
+        queue_sources = await self._legacy_keys(settings.event_queue_name)
+        retry_sources = await self._legacy_keys(settings.retry_queue_name)
+        if not queue_sources and not retry_sources:
+            return
+        
+        move_tail = self.payload_redis.register_script(MOVE_QUEUE_TAIL_SCRIPT)
+        move_retries = self.payload_redis.register_script(MOVE_RETRIES_SCRIPT)
+        await self.payload_redis.script_load(MOVE_QUEUE_TAIL_SCRIPT)
+        await self.payload_redis.script_load(MOVE_RETRIES_SCRIPT)
+        moved_events = moved_retries = 0
+        
+        for source in queue_sources:
+            while True:
+                tail = await self.payload_redis.lrange(source, -LEGACY_DRAIN_CHUNK, -1)
+                if not tail:
+                    break
+                targets = [self._queue_key(self.partition_of(self._decode(data))) for data in tail]
+                moved_events += await move_tail(keys=[source] + targets, args=tail)
+        
+        for source in retry_sources:
+            while True:
+                due = await self.payload_redis.zrange(source, 0, LEGACY_DRAIN_CHUNK - 1, withscores=True)
+                if not due:
+                    break
+                targets = [self._retry_key(self.partition_of(self._decode(member))) for member, _ in due]
+                moved_retries += await move_retries(
+                    keys=[source] + targets,
+                    args=[value for member, score in due for value in (member, score)]
+                )
+        
+        if moved_events or moved_retries:
+            logger.warning(
+                f"Moved {moved_events} queued events and {moved_retries} retries "
+                f"from previous partition layout to {self.partitions} partitions"
+            )
+    
+    @staticmethod
+    def _encode(event: Dict[str, Any]) -> Union[str, bytes]:
+        return queue_codec.encode(event, settings.queue_encoding)
+    
+    @staticmethod
+    def _decode(data: Union[str, bytes]) -> Dict[str, Any]:
+        # Format dideteksi per message, sehingga JSON lama dan biner baru bisa dibaca bersamaan
+        return queue_codec.decode(data)
+    
+    async def _decode_messages(
+        self,
+        messages: List[Tuple[Optional[str], Dict[bytes, Union[str, bytes]]]]
+    ) -> List[QueuedEvent]:
+        """
+        Decode message (message_id, fields) satu per satu. Message yang tidak
+        bisa di-decode dipindah apa adanya ke dead letter queue (dan di-ack),
+        sehingga tidak menggagalkan message lain yang diambil bersamanya.
+        """
+        batch: List[QueuedEvent] = []
+        undecodable: List[str] = []
+        for message_id, fields in messages:
+            try:
+                batch.append((message_id, self._decode(fields[b'event'])))
+            except Exception as e:
+                if await self._dead_letter_undecodable(message_id, fields, f"Undecodable message: {e}"):
+                    if message_id:
+                        undecodable.append(message_id)
+        if undecodable:
+            await self.ack(undecodable)
+        return batch
+    
+    async def _dead_letter_undecodable(
+        self,
+        message_id: Optional[str],
+        fields: Dict[bytes, Union[str, bytes]],
+        error: str
+    ) -> bool:
+        """
+        Simpan message yang tidak bisa di-decode ke dead letter queue sebagai
+        JSON berisi field mentah (base64). Returns False jika gagal disimpan.
+        """
+        entry = {
+            '_raw': {
+                key.decode(errors='replace'): base64.b64encode(
+                    value.encode() if isinstance(value, str) else value
+                ).decode()
+                for key, value in fields.items()
+            },
+            '_message_id': message_id,
+            '_error': error,
+            '_failed_at': datetime.utcnow().isoformat()
+        }
+        try:
+            await self.redis.lpush(settings.dead_letter_queue_name, json.dumps(entry))
+            logger.warning(f"Undecodable message moved to dead letter queue: {error}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to move undecodable message to dead letter queue: {e}")
+            return False
+    
     async def publish_event(self, event: Dict[str, Any]) -> bool:
         """
         Publish event to queue.
         Uses LPUSH for FIFO ordering when consumed with BRPOP.
         """
         try:
-            event_json = json.dumps(event, default=str)
-            await self.redis.lpush(settings.event_queue_name, event_json)
+            event_json = self._encode(event)
+            await self.redis.lpush(self._queue_key(self.partition_of(event)), event_json)
             logger.debug(f"Event published: {event.get('event_id')}")
             return True
         except Exception as e:
@@ -73,53 +328,173 @@ class Broker:
             return False
     
     async def publish_batch(self, events: List[Dict[str, Any]]) -> int:
-        """Publish multiple events atomically using pipeline"""
+        """
+        Publish multiple events atomically dengan satu LPUSH variadic per
+        partisi. Urutan FIFO tetap terjaga (event pertama di-pop lebih dulu
+        oleh BRPOP).
+        """
+        if not events:
+            return 0
+        by_partition: Dict[int, List[str]] = {}
+        for event in events:
+            by_partition.setdefault(self.partition_of(event), []).append(self._encode(event))
         try:
-            async with self.redis.pipeline(transaction=True) as pipe:
-                for event in events:
-                    event_json = json.dumps(event, default=str)
-                    pipe.lpush(settings.event_queue_name, event_json)
+            async with self.redis.pipeline(transaction=len(by_partition) > 1) as pipe:
+                for partition, encoded in by_partition.items():
+                    pipe.lpush(self._queue_key(partition), *encoded)
                 await pipe.execute()
-            logger.info(f"Batch of {len(events)} events published")
+            logger.debug(f"Batch of {len(events)} events published")
             return len(events)
         except Exception as e:
             logger.error(f"Failed to publish batch: {e}")
             return 0
     
-    async def consume_event(self, timeout: float = 5.0) -> Optional[Dict[str, Any]]:
+    async def consume_events(
+        self,
+        consumer: str,
+        count: int = 1,
+        timeout: float = 5.0
+    ) -> List[QueuedEvent]:
         """
-        Consume single event from queue with blocking.
-        Uses BRPOP for at-least-once delivery.
+        Consume hingga count event dari queue.
+        BRPOP (blocking) untuk event pertama, sisanya RPOP tanpa menunggu dari
+        partisi yang sama. Dengan partisi, hanya partisi milik consumer yang
+        dibaca.
         """
         try:
-            result = await self.redis.brpop(settings.event_queue_name, timeout=timeout)
-            if result:
-                _, event_json = result
-                event = json.loads(event_json)
-                return event
-            return None
+            if self._assigner:
+                owned = await self._assigner.partitions_for(consumer)
+                if not owned:
+                    # Tidak ada partisi (worker > partisi): tunggu rebalancing
+                    await asyncio.sleep(min(timeout, settings.partition_heartbeat_seconds))
+                    return []
+                self._rotation = (self._rotation + 1) % len(owned)
+                keys = [self._queue_key(p) for p in owned[self._rotation:] + owned[:self._rotation]]
+            else:
+                keys = [settings.event_queue_name]
+            
+            result = await self.payload_redis.brpop(keys, timeout=timeout)
+            if not result:
+                return []
+            key, raw = result[0], [result[1]]
+            if count > 1:
+                raw.extend(await self.payload_redis.rpop(key, count - 1) or [])
+            # Message sudah dihapus dari queue: decode per message agar satu
+            # message rusak (dipindah ke dead letter queue) tidak menghilangkan sisanya
+            return await self._decode_messages([(None, {b'event': data}) for data in raw])
         except Exception as e:
             logger.error(f"Failed to consume event: {e}")
-            return None
+            return []
+    
+    async def ack(self, message_ids: List[str]) -> None:
+        """Acknowledge event yang sudah di-commit (list: sudah dihapus saat pop)"""
+    
+    async def release_consumer(self, consumer: str) -> None:
+        """Lepaskan consumer saat worker berhenti (lepas partisi agar segera di-rebalance)"""
+        if self._assigner:
+            await self._assigner.leave(consumer)
+    
+    async def _partition_sizes(self) -> List[int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for partition in range(self.partitions):
+                pipe.llen(self._queue_key(partition))
+            return await pipe.execute()
     
     async def get_queue_size(self) -> int:
-        """Get current queue size"""
+        """Get current queue size (total seluruh partisi)"""
         try:
-            return await self.redis.llen(settings.event_queue_name)
+            return sum(await self._partition_sizes())
         except Exception as e:
             logger.error(f"Failed to get queue size: {e}")
             return 0
     
+    async def broker_metrics(self) -> Dict[str, Any]:
+        """Metrik queue untuk /stats"""
+        try:
+            partition_sizes = await self._partition_sizes()
+            retry_scheduled, dead_letter_size = await self._retry_and_dead_letter_sizes()
+            metrics = {
+                'backend': self.backend,
+                'queue_size': sum(partition_sizes),
+                'retry_scheduled': retry_scheduled,
+                'dead_letter_size': dead_letter_size
+            }
+            if self._assigner:
+                metrics['partitions'] = self.partitions
+                metrics['partition_sizes'] = partition_sizes
+                metrics['partition_members'] = await self._assigner.member_count()
+            return metrics
+        except Exception as e:
+            logger.error(f"Failed to get broker metrics: {e}")
+            return {'backend': self.backend}
+    
+    async def _retry_and_dead_letter_sizes(self) -> Tuple[int, int]:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for partition in range(self.partitions):
+                pipe.zcard(self._retry_key(partition))
+            pipe.llen(settings.dead_letter_queue_name)
+            results = await pipe.execute()
+        return sum(results[:-1]), results[-1]
+    
+    async def schedule_retry(self, event: Dict[str, Any], delay_seconds: float) -> None:
+        """
+        Jadwalkan retry: event disimpan di sorted set dengan score waktu jatuh
+        tempo (epoch) dan dipindahkan ke queue oleh retry mover.
+        
+        _retry_id unik per jadwal: member sorted set adalah payload ter-encode,
+        sehingga tanpa nonce dua event identik yang gagal bersamaan akan
+        diciutkan menjadi satu member (ZADD hanya meng-update score).
+        """
+        event['_retry_id'] = uuid.uuid4().hex
+        await self.redis.zadd(
+            self._retry_key(self.partition_of(event)),
+            {self._encode(event): time.time() + delay_seconds}
+        )
+        logger.debug(f"Retry scheduled in {delay_seconds:.2f}s: {event.get('event_id')}")
+    
+    async def promote_due_retries(self) -> int:
+        """Pindahkan retry yang sudah jatuh tempo ke queue utama (per partisi)"""
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for partition in range(self.partitions):
+                await self._promote_retries(
+                    keys=[self._retry_key(partition), self._queue_key(partition)],
+                    args=[now, settings.retry_promote_batch_size, self.backend, settings.stream_maxlen],
+                    client=pipe
+                )
+            return sum(await pipe.execute())
+    
+    async def run_retry_mover(self) -> None:
+        """
+        Loop background yang mempromosikan retry jatuh tempo. Worker tidak
+        pernah sleep untuk backoff; event menunggu di sorted set.
+        """
+        logger.info("Retry mover started")
+        while True:
+            try:
+                promoted = await self.promote_due_retries()
+                if promoted:
+                    logger.info(f"Promoted {promoted} retries to queue")
+                # Backlog retry jatuh tempo masih ada, lanjut tanpa menunggu
+                if promoted >= settings.retry_promote_batch_size:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Retry mover failed: {e}")
+            await asyncio.sleep(settings.retry_poll_interval_seconds)
+    
     async def move_to_dead_letter(self, event: Dict[str, Any], error: str) -> None:
-        """Move failed event to dead letter queue"""
+        """Move failed event to dead letter queue (raise jika gagal, event belum aman)"""
         try:
             event['_error'] = error
             event['_failed_at'] = datetime.utcnow().isoformat()
-            event_json = json.dumps(event, default=str)
+            event_json = self._encode(event)
             await self.redis.lpush(settings.dead_letter_queue_name, event_json)
             logger.warning(f"Event moved to dead letter queue: {event.get('event_id')}")
         except Exception as e:
             logger.error(f"Failed to move to dead letter queue: {e}")
+            raise
     
     async def health_check(self) -> bool:
         """Check Redis connectivity"""
@@ -130,41 +505,183 @@ class Broker:
             logger.error(f"Redis health check failed: {e}")
             return False
     
+    async def _collect_batch(self, consumer: str) -> List[QueuedEvent]:
+        """
+        Micro-batch: ambil hingga batch_size event. Setelah event pertama
+        tiba, tunggu event berikutnya maksimal batch_timeout_seconds.
+        """
+        batch = await self.consume_events(consumer, count=settings.batch_size, timeout=1.0)
+        if not batch:
+            return batch
+        
+        deadline = time.monotonic() + settings.batch_timeout_seconds
+        while len(batch) < settings.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining < 0.001:
+                break
+            more = await self.consume_events(
+                consumer, count=settings.batch_size - len(batch), timeout=remaining
+            )
+            if not more:
+                break
+            batch.extend(more)
+        return batch
+    
+    async def _requeue(self, batch: List[QueuedEvent]) -> None:
+        """
+        Kembalikan event yang sudah di-pop tetapi belum diproses ke head queue
+        (RPUSH urutan terbalik, event pertama di-pop lebih dulu lagi).
+        """
+        by_partition: Dict[int, List[Union[str, bytes]]] = {}
+        for _, event in batch:
+            by_partition.setdefault(self.partition_of(event), []).append(self._encode(event))
+        try:
+            async with self.redis.pipeline(transaction=len(by_partition) > 1) as pipe:
+                for partition, encoded in by_partition.items():
+                    pipe.rpush(self._queue_key(partition), *reversed(encoded))
+                await pipe.execute()
+            logger.warning(f"Requeued {len(batch)} unprocessed events")
+        except Exception as e:
+            logger.error(f"Failed to requeue {len(batch)} events: {e}")
+    
+    async def _process_one(
+        self,
+        process_func: Callable[[Dict[str, Any]], Any],
+        worker_id: str,
+        message_id: Optional[str],
+        event: Dict[str, Any]
+    ) -> None:
+        """Proses satu event dengan retry/DLQ, lalu ack"""
+        try:
+            await process_func(event)
+            logger.debug(f"Worker {worker_id} processed: {event.get('event_id')}")
+        except Exception as e:
+            logger.error(f"Worker {worker_id} failed to process event: {e}")
+            # Jadwalkan retry dengan backoff atau move to dead letter
+            retries = event.get('_retries', 0)
+            if retries < settings.max_retries:
+                event['_retries'] = retries + 1
+                await self.schedule_retry(
+                    event,
+                    settings.retry_delay_seconds * (settings.retry_backoff_multiplier ** retries)
+                )
+            else:
+                await self.move_to_dead_letter(event, str(e))
+        # Ack setelah commit, atau setelah event dijadwalkan retry/dipindah ke DLQ
+        if message_id:
+            await self.ack([message_id])
+    
+    def _owns(self, consumer: str, batch: List[QueuedEvent]) -> bool:
+        """True jika lease seluruh partisi event di batch masih dipegang consumer"""
+        if not self._assigner:
+            return True
+        return all(self._assigner.holds(consumer, self.partition_of(event)) for _, event in batch)
+    
+    async def _renew_leases(self, consumer: str) -> None:
+        while True:
+            await asyncio.sleep(self._assigner.heartbeat_seconds)
+            try:
+                await self._assigner.renew(consumer)
+            except Exception as e:
+                logger.warning(f"Failed to renew partition leases for {consumer}: {e}")
+    
+    @asynccontextmanager
+    async def _lease_heartbeat(self, consumer: str):
+        """Perpanjang lease partisi di background selama batch diproses"""
+        if not self._assigner:
+            yield
+            return
+        task = asyncio.create_task(self._renew_leases(consumer))
+        try:
+            yield
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    async def _process_batch(
+        self,
+        process_func: Callable[[Dict[str, Any]], Any],
+        batch_func: Optional[Callable[[List[Dict[str, Any]]], Any]],
+        worker_id: str,
+        consumer: str,
+        batch: List[QueuedEvent]
+    ) -> None:
+        """Commit micro-batch, atau fallback per event dengan retry/DLQ"""
+        if batch_func and len(batch) > 1 and self._owns(consumer, batch):
+            try:
+                await batch_func([event for _, event in batch])
+                await self.ack([message_id for message_id, _ in batch if message_id])
+                logger.debug(f"Worker {worker_id} processed batch of {len(batch)}")
+                return
+            except Exception as e:
+                logger.warning(
+                    f"Worker {worker_id} batch of {len(batch)} failed, "
+                    f"falling back to per-event processing: {e}"
+                )
+        
+        for index, (message_id, event) in enumerate(batch):
+            if not self._owns(consumer, batch[index:index + 1]):
+                logger.warning(f"Worker {worker_id} lost partition lease, returning {len(batch) - index} events")
+                await self._requeue(batch[index:])
+                return
+            try:
+                await self._process_one(process_func, worker_id, message_id, event)
+            except Exception as e:
+                # Retry/DLQ gagal (mis. Redis putus): event ini dan sisa
+                # batch belum aman, kembalikan ke head queue
+                logger.error(f"Worker {worker_id} failed to hand off event: {e}")
+                await self._requeue(batch[index:])
+                await asyncio.sleep(1)
+                return
+    
     async def start_worker(
         self,
         process_func: Callable[[Dict[str, Any]], Any],
-        worker_id: str = "worker-1"
+        worker_id: str = "worker-1",
+        batch_func: Optional[Callable[[List[Dict[str, Any]]], Any]] = None
     ) -> None:
         """
         Start background worker to process events from queue.
         Implements at-least-once delivery with retry logic.
+        
+        Jika batch_func diberikan, worker mengambil micro-batch (batch_size /
+        batch_timeout_seconds) dan meng-commit-nya sekaligus. Jika batch gagal,
+        setiap event diproses ulang dengan process_func sehingga hanya poison
+        message yang masuk retry/DLQ.
+        
+        Dengan partisi, lease diperpanjang di background selama batch diproses
+        dan diperiksa sebelum commit; event dari partisi yang lease-nya hilang
+        dikembalikan ke head queue untuk pemilik baru.
         """
         self._processing = True
+        consumer = f"{socket.gethostname()}-{os.getpid()}-{worker_id}"
         logger.info(f"Worker {worker_id} started")
         
         while self._processing:
             try:
-                event = await self.consume_event(timeout=1.0)
-                if event:
-                    try:
-                        await process_func(event)
-                        logger.debug(f"Worker {worker_id} processed: {event.get('event_id')}")
-                    except Exception as e:
-                        logger.error(f"Worker {worker_id} failed to process event: {e}")
-                        # Retry with backoff or move to dead letter
-                        retries = event.get('_retries', 0)
-                        if retries < settings.max_retries:
-                            event['_retries'] = retries + 1
-                            await self.publish_event(event)
-                            await asyncio.sleep(settings.retry_delay_seconds * (settings.retry_backoff_multiplier ** retries))
-                        else:
-                            await self.move_to_dead_letter(event, str(e))
+                if batch_func and settings.batch_size > 1:
+                    batch = await self._collect_batch(consumer)
+                else:
+                    batch = await self.consume_events(consumer, timeout=1.0)
+                
+                if not batch:
+                    continue
+                
+                async with self._lease_heartbeat(consumer):
+                    await self._process_batch(process_func, batch_func, worker_id, consumer, batch)
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Worker {worker_id} error: {e}")
                 await asyncio.sleep(1)
         
+        try:
+            await self.release_consumer(consumer)
+        except Exception as e:
+            logger.warning(f"Failed to release consumer {consumer}: {e}")
         logger.info(f"Worker {worker_id} stopped")
     
     def stop_workers(self) -> None:
@@ -172,8 +689,204 @@ class Broker:
         self._processing = False
 
 
+class StreamBroker(Broker):
+    """
+    Broker berbasis Redis Streams dengan consumer group.
+    
+    - XADD dengan MAXLEN ~ (approximate trimming)
+    - XREADGROUP COUNT untuk batched read; message tetap pending sampai XACK
+      setelah commit, sehingga crash sebelum commit tidak menghilangkan event
+    - XAUTOCLAIM mengambil alih message yang idle lebih dari
+      stream_claim_idle_ms (consumer crash/hang)
+    - Pending dan lag consumer group tersedia di /stats
+    """
+    
+    backend = "stream"
+    
+    def __init__(self):
+        super().__init__()
+        if self.partitions > 1:
+            logger.warning("queue_partitions is only supported by the list backend; using one stream")
+            self.partitions = 1
+        self._claim_cursor = "0-0"
+        self._last_claim = 0.0
+    
+    async def connect(self) -> None:
+        """Initialize Redis connection dan consumer group"""
+        await super().connect()
+        try:
+            await self.redis.xgroup_create(
+                settings.event_stream_name,
+                settings.stream_consumer_group,
+                id="0",
+                mkstream=True
+            )
+            logger.info(f"Consumer group {settings.stream_consumer_group} created")
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+    
+    def _queue_key(self, partition: int) -> str:
+        return settings.event_stream_name
+    
+    async def publish_event(self, event: Dict[str, Any]) -> bool:
+        """Publish event ke stream (XADD MAXLEN ~)"""
+        try:
+            await self.redis.xadd(
+                settings.event_stream_name,
+                {'event': self._encode(event)},
+                maxlen=settings.stream_maxlen,
+                approximate=True
+            )
+            logger.debug(f"Event published: {event.get('event_id')}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to publish event: {e}")
+            return False
+    
+    async def publish_batch(self, events: List[Dict[str, Any]]) -> int:
+        """Publish multiple events dengan pipeline XADD"""
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for event in events:
+                    pipe.xadd(
+                        settings.event_stream_name,
+                        {'event': self._encode(event)},
+                        maxlen=settings.stream_maxlen,
+                        approximate=True
+                    )
+                await pipe.execute()
+            logger.debug(f"Batch of {len(events)} events published")
+            return len(events)
+        except Exception as e:
+            logger.error(f"Failed to publish batch: {e}")
+            return 0
+    
+    async def consume_events(
+        self,
+        consumer: str,
+        count: int = 1,
+        timeout: float = 5.0
+    ) -> List[QueuedEvent]:
+        """
+        Consume hingga count event via XREADGROUP. Secara berkala message
+        yang stalled di consumer lain diambil alih lebih dulu (XAUTOCLAIM).
+        """
+        try:
+            messages = []
+            if time.monotonic() - self._last_claim >= settings.stream_claim_interval_seconds:
+                self._last_claim = time.monotonic()
+                result = await self.payload_redis.xautoclaim(
+                    settings.event_stream_name,
+                    settings.stream_consumer_group,
+                    consumer,
+                    min_idle_time=settings.stream_claim_idle_ms,
+                    start_id=self._claim_cursor,
+                    count=count
+                )
+                self._claim_cursor, messages = result[0], result[1]
+                if messages:
+                    logger.warning(f"Reclaimed {len(messages)} stalled messages for {consumer}")
+            
+            if not messages:
+                result = await self.payload_redis.xreadgroup(
+                    settings.stream_consumer_group,
+                    consumer,
+                    {settings.event_stream_name: ">"},
+                    count=count,
+                    # block=0 berarti menunggu tanpa batas
+                    block=max(1, int(timeout * 1000))
+                )
+                messages = result[0][1] if result else []
+            
+            # Entry yang sudah di-trim (fields kosong) tidak bisa diproses; di-ack
+            # agar tidak tertinggal di PEL dan di-claim ulang setiap XAUTOCLAIM
+            trimmed = [message_id.decode() for message_id, fields in messages if not fields]
+            if trimmed:
+                logger.warning(f"Acknowledging {len(trimmed)} trimmed messages for {consumer}")
+                await self.ack(trimmed)
+            # Decode per message: entry yang rusak di-dead-letter dan di-ack sendiri,
+            # bukan membuat seluruh batch tertinggal di PEL
+            return await self._decode_messages([
+                (message_id.decode(), fields)
+                for message_id, fields in messages
+                if fields
+            ])
+        except Exception as e:
+            logger.error(f"Failed to consume event: {e}")
+            return []
+    
+    async def ack(self, message_ids: List[str]) -> None:
+        """XACK message yang sudah di-commit"""
+        await self.redis.xack(settings.event_stream_name, settings.stream_consumer_group, *message_ids)
+    
+    async def _requeue(self, batch: List[QueuedEvent]) -> None:
+        """Message yang belum di-ack tetap pending dan diambil alih via XAUTOCLAIM"""
+        logger.warning(f"Leaving {len(batch)} unprocessed messages pending for reclaim")
+    
+    async def release_consumer(self, consumer: str) -> None:
+        """
+        Hapus consumer dari group jika tidak punya message pending, agar
+        consumer dari proses lama tidak menumpuk. Consumer yang masih punya
+        pending dibiarkan; message-nya diambil alih via XAUTOCLAIM.
+        """
+        consumers = await self.redis.xinfo_consumers(
+            settings.event_stream_name, settings.stream_consumer_group
+        )
+        if any(c['name'] == consumer and c['pending'] == 0 for c in consumers):
+            await self.redis.xgroup_delconsumer(
+                settings.event_stream_name, settings.stream_consumer_group, consumer
+            )
+    
+    async def _group_info(self) -> Dict[str, Any]:
+        groups = await self.redis.xinfo_groups(settings.event_stream_name)
+        return next(
+            (g for g in groups if g['name'] == settings.stream_consumer_group),
+            {}
+        )
+    
+    async def get_queue_size(self) -> int:
+        """Jumlah message yang belum dikirim ke consumer (lag consumer group)"""
+        try:
+            lag = (await self._group_info()).get('lag')
+            if lag is None:
+                # Lag tidak diketahui (mis. setelah trimming): pakai panjang stream
+                return await self.redis.xlen(settings.event_stream_name)
+            return lag
+        except Exception as e:
+            logger.error(f"Failed to get queue size: {e}")
+            return 0
+    
+    async def broker_metrics(self) -> Dict[str, Any]:
+        """Panjang stream, pending dan lag consumer group untuk /stats"""
+        try:
+            group = await self._group_info()
+            length = await self.redis.xlen(settings.event_stream_name)
+            retry_scheduled, dead_letter_size = await self._retry_and_dead_letter_sizes()
+        except Exception as e:
+            logger.error(f"Failed to get broker metrics: {e}")
+            return {'backend': self.backend}
+        return {
+            'backend': self.backend,
+            'stream_length': length,
+            'consumer_group': settings.stream_consumer_group,
+            'consumers': group.get('consumers', 0),
+            'pending': group.get('pending', 0),
+            'lag': group.get('lag'),
+            'retry_scheduled': retry_scheduled,
+            'dead_letter_size': dead_letter_size
+        }
+
+
+def create_broker() -> Broker:
+    """Pilih backend broker dari settings.broker_backend"""
+    if settings.broker_backend == "stream":
+        return StreamBroker()
+    return Broker()
+
+
 # Global broker instance
-broker = Broker()
+broker = create_broker()
 
 
 async def get_broker() -> Broker:
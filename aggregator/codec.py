@@ -0,0 +1,85 @@
+"""
+Log Aggregator - JSON Codec
+Encoder/decoder cepat berbasis orjson untuk kolom JSON/JSONB PostgreSQL
+
+orjson hanya mendukung integer 64-bit dan float double: integer yang lebih
+besar gagal di-encode dan di-decode menjadi float (lossy), sedangkan angka di
+luar jangkauan double (mis. 1e400) gagal di-decode. JSON seperti itu tetap
+valid, sehingga ditangani dengan fallback ke modul json standar.
+"""
+import json
+import re
+from datetime import datetime
+from typing import Any, Union
+
+import orjson
+
+# Binary wire format jsonb: satu byte versi diikuti teks JSON (UTF-8)
+JSONB_BINARY_VERSION = b'\x01'
+
+# Angka dengan 19+ digit bisa melewati jangkauan integer 64-bit orjson
+_LONG_NUMBER = re.compile(rb'\d{19}')
+
+
+def _dumps(value: Any, option: int = 0) -> bytes:
+    try:
+        return orjson.dumps(value, option=option)
+    except TypeError:
+        # orjson.JSONEncodeError (subclass TypeError): integer > 64-bit
+        return json.dumps(value, ensure_ascii=False, default=_json_default).encode()
+
+
+def _loads(data: Union[bytes, str]) -> Any:
+    raw = data.encode() if isinstance(data, str) else data
+    if not _LONG_NUMBER.search(raw):
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(raw)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat().replace('+00:00', 'Z')
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_jsonb(value: Any) -> bytes:
+    """Encode value ke binary format jsonb"""
+    return JSONB_BINARY_VERSION + _dumps(value)
+
+
+def decode_jsonb(data: bytes) -> Any:
+    """Decode binary format jsonb"""
+    return _loads(data[1:])
+
+
+def encode_json(value: Any) -> bytes:
+    """Encode value ke binary format json (teks JSON apa adanya)"""
+    return _dumps(value)
+
+
+def decode_json(data: bytes) -> Any:
+    """Decode binary format json"""
+    return _loads(data)
+
+
+def dumps(value: Any) -> str:
+    """Serialize ke string JSON (pengganti json.dumps)"""
+    return _dumps(value).decode()
+
+
+def loads(value: str) -> Any:
+    """Parse string JSON (pengganti json.loads)"""
+    return _loads(value)
+
+
+def dumps_response(value: Any) -> bytes:
+    """Serialize body response; datetime UTC ditulis dengan sufiks Z seperti Pydantic"""
+    return _dumps(value, option=orjson.OPT_UTC_Z)
+
+
+def raw(json_text: str) -> orjson.Fragment:
+    """Bungkus teks JSON yang sudah valid agar disisipkan apa adanya saat serialize"""
+    return orjson.Fragment(json_text)
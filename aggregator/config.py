@@ -4,7 +4,7 @@ Menggunakan Pydantic Settings untuk environment-based configuration
 """
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import Optional
+from typing import Dict, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -15,14 +15,41 @@ class Settings(BaseSettings):
     db_pool_min_size: int = 5
     db_pool_max_size: int = 20
     
+    # Read replica settings (opsional). Query read-only diarahkan ke replica
+    # selama sehat dan lag <= replica_max_lag_seconds, selain itu ke primary.
+    database_read_url: Optional[str] = None
+    db_read_pool_min_size: int = 2
+    db_read_pool_max_size: int = 20
+    replica_max_lag_seconds: float = 5.0
+    replica_check_interval_seconds: float = 5.0
+    
     # Redis broker settings
     broker_url: str = "redis://localhost:6379/0"
     redis_max_connections: int = 50
+    # broker_backend: "list" (LPUSH/BRPOP) atau "stream" (Redis Streams
+    # consumer group dengan XACK setelah commit)
+    broker_backend: Literal["list", "stream"] = "list"
     
     # Worker settings
+    # worker_count: worker task per proses (API server atau proses worker.py)
+    # worker_mode: API server tidak menjalankan worker; queue diproses oleh
+    # runtime standalone (python worker.py)
     worker_count: int = 4
     worker_mode: bool = False
     
+    # Standalone worker runtime (python worker.py)
+    # worker_processes: jumlah proses worker (0 = jumlah core)
+    worker_processes: int = 0
+    worker_restart_max: int = 5
+    worker_restart_window_seconds: float = 60.0
+    worker_restart_backoff_seconds: float = 1.0
+    worker_shutdown_timeout_seconds: float = 15.0
+    
+    # Payload settings
+    # payload_passthrough: GET /events meneruskan payload sebagai raw JSON
+    # tanpa decode/re-encode (payload tidak divalidasi ulang oleh response model)
+    payload_passthrough: bool = False
+    
     # Application settings
     app_name: str = "Log Aggregator"
     app_version: str = "1.0.0"
@@ -33,14 +60,107 @@ class Settings(BaseSettings):
     processing_queue_name: str = "processing_queue"
     dead_letter_queue_name: str = "dead_letter_queue"
     
+    # queue_encoding: wire format payload event di queue. "json" (teks) atau
+    # "msgpack" (biner berversi, timestamp epoch). Worker selalu bisa membaca
+    # keduanya: deploy worker baru lebih dulu, lalu ubah encoding publisher.
+    queue_encoding: Literal["json", "msgpack"] = "json"
+    
+    # Queue partitioning (broker_backend = "list")
+    # queue_partitions > 1: event dibagi ke <event_queue_name>:<n> berdasarkan
+    # hash queue_partition_key ("topic" atau "topic_source"); setiap partisi
+    # dikonsumsi satu worker sehingga urutan FIFO per topic terjaga
+    queue_partitions: int = 1
+    queue_partition_key: Literal["topic", "topic_source"] = "topic"
+    partition_heartbeat_seconds: float = 2.0
+    partition_member_ttl_seconds: float = 10.0
+    
+    # Redis Streams settings (broker_backend = "stream")
+    event_stream_name: str = "event_stream"
+    stream_consumer_group: str = "aggregator"
+    stream_maxlen: int = 1000000
+    stream_claim_idle_ms: int = 60000
+    stream_claim_interval_seconds: float = 30.0
+    
     # Retry settings
     max_retries: int = 3
     retry_delay_seconds: float = 1.0
     retry_backoff_multiplier: float = 2.0
+    # Retry dijadwalkan di sorted set (score = waktu jatuh tempo) dan
+    # dipindahkan ke queue utama oleh retry mover
+    retry_queue_name: str = "retry_queue"
+    retry_poll_interval_seconds: float = 0.5
+    retry_promote_batch_size: int = 500
+    
+    # Statistics settings
+    # stats_mode: "inline" (update di setiap transaction event) atau
+    # "write_behind" (akumulasi di memory, flush periodik)
+    stats_mode: Literal["inline", "write_behind"] = "inline"
+    stats_shard_count: int = 16
+    stats_flush_interval_ms: int = 1000
+    stats_flush_max_events: int = 1000
     
-    # Batch processing settings
+    # Admission control (backpressure endpoint publish)
+    # Queue depth: /publish/queue* ditolak 429 di atas high watermark sampai
+    # queue turun ke low watermark. Pool wait: /publish, /publish/batch dan
+    # /publish/bulk ditolak 503 jika rata-rata tunggu pool.acquire() dalam
+    # window melewati high watermark sampai turun ke low watermark.
+    admission_enabled: bool = True
+    admission_queue_high: int = 100000
+    admission_queue_low: int = 50000
+    admission_pool_wait_high_ms: float = 500.0
+    admission_pool_wait_low_ms: float = 100.0
+    admission_pool_wait_window_seconds: float = 5.0
+    admission_sample_interval_seconds: float = 0.5
+    admission_retry_after_max_seconds: int = 30
+    
+    # Batch processing settings (micro-batch queue worker)
+    # batch_size: maksimal event per commit; batch_timeout_seconds: waktu
+    # tunggu event berikutnya setelah event pertama tiba
     batch_size: int = 100
-    batch_timeout_seconds: float = 5.0
+    batch_timeout_seconds: float = 0.05
+    
+    # Audit log settings (buffered writer di luar transaction ingest)
+    audit_enabled: bool = True
+    audit_duplicate_sample_rate: float = 1.0
+    audit_flush_interval_ms: int = 1000
+    audit_flush_max_records: int = 500
+    audit_buffer_max_records: int = 100000
+    
+    # Events partitioning & retention settings
+    # events_partition_interval: "daily" atau "hourly"
+    # events_retention_hours: 0 = simpan selamanya
+    events_partition_interval: Literal["daily", "hourly"] = "daily"
+    events_partitions_ahead: int = 3
+    events_retention_hours: int = 0
+    partition_maintenance_interval_seconds: float = 300.0
+    
+    # Dedup window settings
+    # dedup_window_hours: 0 = key dedup disimpan selamanya
+    # dedup_window_topics: override per topic dalam jam (JSON), mis. {"metrics": 1}
+    # Key yang melewati window dianggap baru dan dihapus bertahap oleh compaction.
+    dedup_window_hours: float = 0
+    dedup_window_topics: Dict[str, float] = {}
+    dedup_compaction_interval_seconds: float = 60.0
+    dedup_compaction_batch_size: int = 5000
+    dedup_compaction_max_batches: int = 100
+    
+    # Dedup cache settings (LRU + TTL in-process untuk key yang sudah commit).
+    # Duplicate dari cache dihitung sesuai stats_mode: inline = update counter
+    # langsung (exact), write_behind = delta buffer (tanpa query).
+    dedup_cache_enabled: bool = True
+    dedup_cache_max_size: int = 100000
+    dedup_cache_ttl_seconds: float = 300.0
+    
+    # Dedup pre-filter settings (Bloom filter time-bucketed di Redis broker,
+    # dipakai bersama oleh seluruh replica aggregator/worker)
+    dedup_prefilter_enabled: bool = False
+    dedup_prefilter_key: str = "dedup_bloom"
+    dedup_prefilter_bits: int = 8388608
+    dedup_prefilter_hashes: int = 7
+    dedup_prefilter_bucket_seconds: int = 3600
+    
+    # Bulk ingest (COPY) settings
+    bulk_ingest_timeout_seconds: float = 600.0
     
     class Config:
         env_file = ".env"
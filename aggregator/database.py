@@ -2,19 +2,177 @@
 Log Aggregator - Database Module
 Handles PostgreSQL connections and operations with transaction support
 """
+import asyncio
 import asyncpg
-import json
 import logging
-from typing import Optional, List, Dict, Any, Tuple
+import re
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Set, Tuple, AsyncIterable
 from datetime import datetime
 from contextlib import asynccontextmanager
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+import codec
+from admission import WaitTracker
 from config import get_settings
+from stats_buffer import StatsBuffer, TopicDeltas
+from audit_sink import AuditSink, AuditRecord
+from dedup_cache import RecentKeyCache
+from dedup_prefilter import DedupPrefilter
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Key payload yang boleh dipakai pada filter equality. Key disisipkan sebagai
+# literal SQL (bukan parameter) agar planner dapat memakai expression index
+# payload->>'key' juga pada generic plan prepared statement.
+PAYLOAD_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Kolom yang boleh dipakai untuk filter time window GET /events
+TIME_FIELDS = ('timestamp', 'received_at')
+
+# init.sql dan migrate.sql ikut di-copy ke image aggregator
+SCHEMA_DIR = Path(__file__).resolve().parent
+
+# Schema versi lama (atau kosong): salah satu objek schema terbaru belum ada
+_SCHEMA_OUTDATED = """
+    SELECT to_regproc('create_event_partitions') IS NULL
+        OR to_regclass('topic_stats') IS NULL
+        OR to_regclass('events_staging') IS NULL
+        OR NOT EXISTS (
+            SELECT 1 FROM pg_class WHERE oid = to_regclass('events') AND relkind = 'p'
+        )
+        OR NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'statistics' AND column_name = 'slot'
+        )
+        OR NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'processed_events' AND column_name = 'expires_at'
+        )
+"""
+
+# Pindahkan row events lama (disingkirkan migrate.sql) ke tabel partisi.
+# Row lama masuk partisi default; key-nya dipastikan ada di processed_events
+# (dedup store) dan topic_stats dihitung ulang dari data yang ada.
+_MIGRATE_LEGACY_EVENTS = """
+    INSERT INTO events (id, topic, event_id, timestamp, source, payload, received_at, processed_at)
+    SELECT id, topic, event_id, timestamp, source, payload,
+           COALESCE(received_at, CURRENT_TIMESTAMP), processed_at
+    FROM events_legacy;
+    
+    INSERT INTO processed_events (topic, event_id, worker_id)
+    SELECT topic, event_id, 'migration' FROM events_legacy
+    ON CONFLICT (topic, event_id) DO NOTHING;
+    
+    SELECT setval(pg_get_serial_sequence('events', 'id'), COALESCE(MAX(id), 1), MAX(id) IS NOT NULL)
+    FROM events;
+    
+    DROP TABLE events_legacy;
+    
+    SELECT backfill_topic_stats();
+"""
+
+
+def dedup_window_seconds(topic: str) -> Optional[float]:
+    """Lebar dedup window topic dalam detik (None = key tidak pernah expire)"""
+    hours = settings.dedup_window_topics.get(topic, settings.dedup_window_hours)
+    return hours * 3600 if hours > 0 else None
+
+
+def dedup_window_enabled() -> bool:
+    """True jika ada topic dengan dedup window (compaction perlu dijalankan)"""
+    return settings.dedup_window_hours > 0 or any(
+        hours > 0 for hours in settings.dedup_window_topics.values()
+    )
+
+
+# Claim dedup key: key baru di-insert, key yang dedup window-nya sudah lewat
+# (expires_at <= now) di-claim ulang sehingga event dianggap baru. Key tanpa
+# expires_at tidak pernah expire.
+_CLAIM_ON_CONFLICT = """
+    ON CONFLICT (topic, event_id) DO UPDATE
+    SET processed_at = CURRENT_TIMESTAMP,
+        worker_id = EXCLUDED.worker_id,
+        expires_at = EXCLUDED.expires_at
+    WHERE processed_events.expires_at <= CURRENT_TIMESTAMP
+"""
+
+# Single-statement idempotent insert: claim dedup key, insert event, dan
+# (mode inline) update statistics + topic_stats dalam satu round trip.
+# Parameter: $1 topic, $2 event_id, $3 timestamp, $4 source, $5 payload,
+# $6 worker_id, $7 dedup window (detik, NULL = selamanya),
+# $8 stats_shard_count (hanya untuk varian dengan statistics).
+_INSERT_EVENT_CTE = """
+    WITH claimed AS (
+        INSERT INTO processed_events (topic, event_id, worker_id, expires_at)
+        VALUES ($1, $2, $6, CURRENT_TIMESTAMP + make_interval(secs => $7::float8))
+""" + _CLAIM_ON_CONFLICT + """
+        RETURNING topic, event_id
+    ),
+    inserted AS (
+        INSERT INTO events (topic, event_id, timestamp, source, payload, processed_at)
+        SELECT topic, event_id, $3, $4, $5, CURRENT_TIMESTAMP FROM claimed
+    ),
+    outcome AS (
+        SELECT COUNT(*)::BIGINT AS unique_delta FROM claimed
+    )
+"""
+
+_INSERT_EVENT_STATS_CTE = """
+    , counters AS (
+        INSERT INTO statistics (stat_key, slot, stat_value)
+        SELECT d.stat_key, pg_backend_pid() % $8, d.delta
+        FROM outcome, unnest(
+            ARRAY['received', 'unique_processed', 'duplicate_dropped']::varchar[],
+            ARRAY[1, outcome.unique_delta, 1 - outcome.unique_delta]::bigint[]
+        ) AS d(stat_key, delta)
+        WHERE d.delta <> 0
+        ON CONFLICT (stat_key, slot) DO UPDATE
+        SET stat_value = statistics.stat_value + EXCLUDED.stat_value,
+            updated_at = CURRENT_TIMESTAMP
+    ),
+    topic_counters AS (
+        INSERT INTO topic_stats (topic, slot, unique_count, duplicate_count, last_seen)
+        SELECT $1, pg_backend_pid() % $8, unique_delta, 1 - unique_delta, CURRENT_TIMESTAMP
+        FROM outcome
+        ON CONFLICT (topic, slot) DO UPDATE
+        SET unique_count = topic_stats.unique_count + EXCLUDED.unique_count,
+            duplicate_count = topic_stats.duplicate_count + EXCLUDED.duplicate_count,
+            last_seen = EXCLUDED.last_seen
+    )
+"""
+
+_INSERT_EVENT_RESULT = """
+    SELECT unique_delta = 1 AS is_new FROM outcome
+"""
+
+
+async def _init_connection(conn: asyncpg.Connection) -> None:
+    """
+    Configure JSON codec for JSONB columns.
+    Menggunakan orjson dengan binary format sehingga asyncpg tidak perlu
+    decode/encode teks UTF-8 tambahan untuk setiap payload.
+    """
+    await conn.set_type_codec(
+        'jsonb',
+        encoder=codec.encode_jsonb,
+        decoder=codec.decode_jsonb,
+        schema='pg_catalog',
+        format='binary'
+    )
+    await conn.set_type_codec(
+        'json',
+        encoder=codec.encode_json,
+        decoder=codec.decode_json,
+        schema='pg_catalog',
+        format='binary'
+    )
+
 
 class Database:
     """
@@ -24,6 +182,19 @@ class Database:
     
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        self.read_pool: Optional[asyncpg.Pool] = None
+        self.stats_buffer: Optional[StatsBuffer] = None
+        # False: counter statistics diakumulasi di stats_buffer (write-behind)
+        self.inline_stats = settings.stats_mode != "write_behind"
+        self.audit_sink: Optional[AuditSink] = None
+        self.dedup_cache: Optional[RecentKeyCache] = None
+        # Dipasang dari lifespan setelah broker terhubung (memakai koneksi Redis broker)
+        self.dedup_prefilter: Optional[DedupPrefilter] = None
+        self.replica_healthy = False
+        self.replica_lag_seconds: Optional[float] = None
+        self._replica_monitor: Optional[asyncio.Task] = None
+        # Waktu tunggu pool.acquire() di jalur write (sinyal admission control)
+        self.pool_wait = WaitTracker(settings.admission_pool_wait_window_seconds)
         self._connected = False
     
     async def connect(self) -> None:
@@ -31,37 +202,97 @@ class Database:
         if self.pool is not None:
             return
         
-        async def init_connection(conn):
-            """Configure JSON codec for JSONB columns"""
-            await conn.set_type_codec(
-                'jsonb',
-                encoder=json.dumps,
-                decoder=json.loads,
-                schema='pg_catalog'
-            )
-            await conn.set_type_codec(
-                'json',
-                encoder=json.dumps,
-                decoder=json.loads,
-                schema='pg_catalog'
-            )
-        
         try:
             self.pool = await asyncpg.create_pool(
                 settings.database_url,
                 min_size=settings.db_pool_min_size,
                 max_size=settings.db_pool_max_size,
                 command_timeout=60,
-                init=init_connection
+                init=_init_connection
             )
             self._connected = True
             logger.info("Database connection pool established")
+            
+            await self.migrate_schema()
+            
+            if settings.database_read_url:
+                await self._check_replica()
+                self._replica_monitor = asyncio.create_task(self._monitor_replica())
+            
+            if not self.inline_stats:
+                self.stats_buffer = StatsBuffer(
+                    self._flush_statistics,
+                    flush_interval_ms=settings.stats_flush_interval_ms,
+                    flush_max_events=settings.stats_flush_max_events
+                )
+                self.stats_buffer.start()
+            
+            if settings.audit_enabled:
+                self.audit_sink = AuditSink(
+                    self._write_audit_records,
+                    flush_interval_ms=settings.audit_flush_interval_ms,
+                    flush_max_records=settings.audit_flush_max_records,
+                    buffer_max_records=settings.audit_buffer_max_records,
+                    duplicate_sample_rate=settings.audit_duplicate_sample_rate
+                )
+                self.audit_sink.start()
+            
+            if settings.dedup_cache_enabled:
+                self.dedup_cache = RecentKeyCache(
+                    max_size=settings.dedup_cache_max_size,
+                    ttl_seconds=settings.dedup_cache_ttl_seconds
+                )
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
             raise
     
+    async def migrate_schema(self) -> bool:
+        """
+        Upgrade schema database lama ke schema init.sql.
+        
+        Postgres hanya menjalankan init.sql saat volume pg_data masih kosong,
+        sehingga deployment lama tidak punya tabel partisi events, kolom dan
+        fungsi baru (mis. create_event_partitions). Jika schema terdeteksi
+        versi lama, migrate.sql, init.sql dan pemindahan row events lama
+        dijalankan dalam satu transaction di bawah advisory lock: proses yang
+        start bersamaan hanya meng-upgrade sekali, dan upgrade yang gagal
+        tidak meninggalkan schema setengah jadi.
+        
+        Returns:
+            bool: True jika schema di-upgrade
+        """
+        async with self.pool.acquire() as conn:
+            if not await conn.fetchval(_SCHEMA_OUTDATED):
+                return False
+            
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrate'))")
+                if not await conn.fetchval(_SCHEMA_OUTDATED):
+                    return False
+                
+                await conn.execute((SCHEMA_DIR / "migrate.sql").read_text())
+                await conn.execute((SCHEMA_DIR / "init.sql").read_text())
+                if await conn.fetchval("SELECT to_regclass('events_legacy') IS NOT NULL"):
+                    await conn.execute(_MIGRATE_LEGACY_EVENTS)
+        
+        logger.info("Database schema upgraded to the current init.sql layout")
+        return True
+    
     async def disconnect(self) -> None:
         """Close connection pool"""
+        if self._replica_monitor:
+            self._replica_monitor.cancel()
+            self._replica_monitor = None
+        if self.read_pool:
+            await self.read_pool.close()
+            self.read_pool = None
+            self.replica_healthy = False
+        if self.audit_sink:
+            await self.audit_sink.stop()
+            self.audit_sink = None
+        if self.stats_buffer:
+            await self.stats_buffer.stop()
+            self.stats_buffer = None
         if self.pool:
             await self.pool.close()
             self.pool = None
@@ -72,6 +303,19 @@ class Database:
     def is_connected(self) -> bool:
         return self._connected and self.pool is not None
     
+    @asynccontextmanager
+    async def acquire(self):
+        """Acquire connection primary dengan mencatat waktu tunggu pool"""
+        token = self.pool_wait.start()
+        try:
+            conn = await self.pool.acquire()
+        finally:
+            self.pool_wait.finish(token)
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+    
     @asynccontextmanager
     async def transaction(self):
         """
@@ -83,17 +327,28 @@ class Database:
         3. Performa lebih baik dari SERIALIZABLE
         4. Unique constraints sudah menjamin atomicity untuk insert
         """
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             async with conn.transaction(isolation='read_committed'):
                 yield conn
     
+    @asynccontextmanager
+    async def read_connection(self):
+        """
+        Connection untuk query read-only.
+        Diarahkan ke read replica jika dikonfigurasi dan sehat (lag di bawah
+        replica_max_lag_seconds), selain itu fallback ke primary.
+        """
+        pool = self.read_pool if (self.read_pool and self.replica_healthy) else self.pool
+        async with pool.acquire() as conn:
+            yield conn
+    
     @asynccontextmanager
     async def serializable_transaction(self):
         """
         Transaction dengan SERIALIZABLE isolation untuk operasi kritis.
         Digunakan ketika perlu absolute consistency (jarang dibutuhkan).
         """
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             async with conn.transaction(isolation='serializable'):
                 yield conn
     
@@ -106,9 +361,26 @@ class Database:
         source: str,
         payload: dict,
         worker_id: str = "main"
+    ) -> Tuple[bool, bool]:
+        """
+        insert_event_once dengan retry in-process (exponential backoff) untuk
+        request API sinkron. Worker queue memanggil insert_event_once langsung;
+        backoff-nya ditangani retry sorted set broker.
+        """
+        return await self.insert_event_once(topic, event_id, timestamp, source, payload, worker_id)
+    
+    async def insert_event_once(
+        self,
+        topic: str,
+        event_id: str,
+        timestamp: datetime,
+        source: str,
+        payload: dict,
+        worker_id: str = "main"
     ) -> Tuple[bool, bool]:
         """
         Insert event dengan idempotent pattern menggunakan ON CONFLICT DO NOTHING.
+        Satu percobaan tanpa retry; error diteruskan ke pemanggil.
         
         Returns:
             Tuple[bool, bool]: (success, is_new_event)
@@ -117,179 +389,708 @@ class Database:
         
         Isolation: READ COMMITTED dengan unique constraint
         Pattern: INSERT ... ON CONFLICT DO NOTHING
+        
+        Tabel events dipartisi per received_at sehingga tidak bisa memiliki
+        unique (topic, event_id); key di-claim lebih dulu di processed_events.
+        
+        Seluruh langkah (claim, insert events, statistics) dijalankan sebagai
+        satu statement data-modifying CTE. Satu statement sudah atomic, sehingga
+        tidak perlu BEGIN/COMMIT terpisah: cukup satu round trip per event.
+        
+        Dedup hanya berlaku di dalam dedup window topic: key yang sudah
+        expire di-claim ulang dan event dianggap baru.
+        
+        Key yang ada di dedup cache langsung dijawab sebagai duplicate tanpa
+        claim/insert (mode inline hanya update counter statistics); miss tetap
+        diputuskan oleh unique constraint.
+        Dengan dedup pre-filter (bersama antar replica), key yang pasti baru
+        langsung di-insert, sedangkan probable duplicate dikonfirmasi dengan
+        read ringan sebelum insert.
         """
-        async with self.transaction() as conn:
-            # Step 1: Try to insert into events table
-            result = await conn.execute("""
-                INSERT INTO events (topic, event_id, timestamp, source, payload, processed_at)
-                VALUES ($1, $2, $3, $4, $5, CURRENT_TIMESTAMP)
-                ON CONFLICT (topic, event_id) DO NOTHING
-            """, topic, event_id, timestamp, source, payload)
-            
-            # Check if insert happened (result contains "INSERT 0 1" if successful)
-            is_new = "INSERT 0 1" in result
-            
+        if self.dedup_cache and self.dedup_cache.contains(topic, event_id):
+            await self._record_short_circuit_duplicate(topic, event_id, worker_id, "cache")
+            return True, False
+        
+        window = dedup_window_seconds(topic)
+        
+        if self.dedup_prefilter and await self.dedup_prefilter.check_and_mark(topic, event_id):
+            if await self.check_event_exists(topic, event_id):
+                await self._record_short_circuit_duplicate(topic, event_id, worker_id, "prefilter")
+                if self.dedup_cache and window is None:
+                    self.dedup_cache.add(topic, event_id)
+                return True, False
+            self.dedup_prefilter.record_false_positive()
+        
+        async with self.acquire() as conn:
+            if not self.inline_stats:
+                is_new = await conn.fetchval(
+                    _INSERT_EVENT_CTE + _INSERT_EVENT_RESULT,
+                    topic, event_id, timestamp, source, payload, worker_id, window
+                )
+            else:
+                is_new = await conn.fetchval(
+                    _INSERT_EVENT_CTE + _INSERT_EVENT_STATS_CTE + _INSERT_EVENT_RESULT,
+                    topic, event_id, timestamp, source, payload, worker_id,
+                    window, settings.stats_shard_count
+                )
+        
+        if is_new:
+            logger.info(f"New event processed: {topic}/{event_id}")
+        else:
+            logger.info(f"Duplicate event dropped: {topic}/{event_id}")
+        
+        if not self.inline_stats:
+            self.stats_buffer.add(1, int(is_new), int(not is_new), {topic: (int(is_new), int(not is_new))})
+        
+        # Key baru di-cache maksimal selama dedup window-nya. Duplicate hanya
+        # di-cache jika key tidak pernah expire (waktu claim aslinya tidak diketahui).
+        if self.dedup_cache and (is_new or window is None):
+            self.dedup_cache.add(topic, event_id, window)
+        
+        # Audit di luar transaction ingest, ditulis batch oleh audit sink
+        if self.audit_sink:
             if is_new:
-                # Step 2: Record in processed_events for tracking
-                await conn.execute("""
-                    INSERT INTO processed_events (topic, event_id, worker_id)
-                    VALUES ($1, $2, $3)
-                    ON CONFLICT (topic, event_id) DO NOTHING
-                """, topic, event_id, worker_id)
-                
-                # Step 3: Update statistics atomically
-                await conn.execute("""
-                    UPDATE statistics SET stat_value = stat_value + 1, updated_at = CURRENT_TIMESTAMP
-                    WHERE stat_key = 'unique_processed'
-                """)
-                
-                # Step 4: Log to audit
-                await conn.execute("""
-                    INSERT INTO audit_log (operation, topic, event_id, details)
-                    VALUES ('INSERT', $1, $2, $3)
-                """, topic, event_id, {"source": source, "worker_id": worker_id})
-                
-                logger.info(f"New event processed: {topic}/{event_id}")
+                self.audit_sink.record('INSERT', topic, event_id, {"source": source, "worker_id": worker_id})
             else:
-                # Event is duplicate - update duplicate counter
-                await conn.execute("""
-                    UPDATE statistics SET stat_value = stat_value + 1, updated_at = CURRENT_TIMESTAMP
-                    WHERE stat_key = 'duplicate_dropped'
-                """)
-                
-                await conn.execute("""
-                    INSERT INTO audit_log (operation, topic, event_id, details)
-                    VALUES ('DUPLICATE', $1, $2, $3)
-                """, topic, event_id, {"worker_id": worker_id})
-                
-                logger.info(f"Duplicate event dropped: {topic}/{event_id}")
-            
-            # Always increment received counter
-            await conn.execute("""
-                UPDATE statistics SET stat_value = stat_value + 1, updated_at = CURRENT_TIMESTAMP
-                WHERE stat_key = 'received'
-            """)
-            
-            return True, is_new
+                self.audit_sink.record('DUPLICATE', topic, event_id, {"worker_id": worker_id})
+        
+        return True, is_new
+    
+    async def _record_short_circuit_duplicate(
+        self,
+        topic: str,
+        event_id: str,
+        worker_id: str,
+        via: str
+    ) -> None:
+        """
+        Hitung duplicate yang dijawab tanpa insert CTE (dedup cache / pre-filter).
+        Mode inline: counter diupdate langsung (satu statement ringan, tanpa
+        claim dedup) sehingga /stats tetap exact di seluruh proses.
+        """
+        logger.info(f"Duplicate event dropped ({via}): {topic}/{event_id}")
+        if self.inline_stats:
+            async with self.acquire() as conn:
+                await self._update_statistics(conn, 1, 0, 1, {topic: (0, 1)})
+        else:
+            self.stats_buffer.add(1, 0, 1, {topic: (0, 1)})
+        if self.audit_sink:
+            self.audit_sink.record('DUPLICATE', topic, event_id, {"worker_id": worker_id, "via": via})
     
     async def batch_insert_events_atomic(
         self,
         events: List[Dict[str, Any]],
         worker_id: str = "main"
-    ) -> Tuple[int, int, int]:
+    ) -> Tuple[int, int, int, Set[Tuple[str, str]]]:
         """
         Batch insert dengan atomic transaction.
         Seluruh batch berhasil atau gagal bersama.
         
+        Duplikat di dalam batch diciutkan di Python lebih dulu (event pertama
+        yang disimpan, sama seperti perilaku insert per-event), dan key yang
+        ada di dedup cache langsung dihitung sebagai duplicate, sehingga hanya
+        key distinct yang dikirim ke database.
+        
+        Set-based: key distinct dikirim sebagai array (unnest) dalam satu
+        statement INSERT ... SELECT ... ON CONFLICT RETURNING, sehingga jumlah
+        round trip tidak bertambah seiring ukuran batch. Key di-claim di
+        processed_events, lalu hanya key yang berhasil di-claim yang di-insert
+        ke events.
+        
+        Setelah commit, key baru ditandai di dedup pre-filter dan setiap event
+        dicatat ke audit sink (INSERT/DUPLICATE), sama seperti insert per-event.
+        
         Returns:
-            Tuple[int, int, int]: (total, new_count, duplicate_count)
+            Tuple[int, int, int, set]: (total, new_count, duplicate_count,
+            key (topic, event_id) yang baru disimpan)
         """
-        new_count = 0
-        duplicate_count = 0
+        total = len(events)
+        
+        distinct: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for e in events:
+            distinct.setdefault((e['topic'], e['event_id']), e)
+        if self.dedup_cache:
+            distinct = {
+                key: e for key, e in distinct.items()
+                if not self.dedup_cache.contains(*key)
+            }
+        candidates = list(distinct.values())
         
         async with self.transaction() as conn:
-            for event in events:
-                result = await conn.execute("""
+            # Step 1: Claim processed_events + insert events dalam satu statement
+            new_rows = await conn.fetch(f"""
+                WITH input AS (
+                    SELECT topic, event_id, timestamp, source, payload, dedup_window_seconds
+                    FROM unnest($1::varchar[], $2::varchar[], $3::timestamptz[],
+                                $4::varchar[], $5::jsonb[], $7::float8[])
+                         AS t(topic, event_id, timestamp, source, payload, dedup_window_seconds)
+                ),
+                claimed AS (
+                    INSERT INTO processed_events (topic, event_id, worker_id, expires_at)
+                    SELECT topic, event_id, $6,
+                           CURRENT_TIMESTAMP + make_interval(secs => dedup_window_seconds)
+                    FROM input
+                    {_CLAIM_ON_CONFLICT}
+                    RETURNING topic, event_id
+                ),
+                inserted AS (
                     INSERT INTO events (topic, event_id, timestamp, source, payload, processed_at)
-                    VALUES ($1, $2, $3, $4, $5, CURRENT_TIMESTAMP)
-                    ON CONFLICT (topic, event_id) DO NOTHING
-                """, event['topic'], event['event_id'], event['timestamp'], 
-                    event['source'], event['payload'])
-                
-                if "INSERT 0 1" in result:
-                    new_count += 1
-                    await conn.execute("""
-                        INSERT INTO processed_events (topic, event_id, worker_id)
-                        VALUES ($1, $2, $3)
-                        ON CONFLICT (topic, event_id) DO NOTHING
-                    """, event['topic'], event['event_id'], worker_id)
-                else:
-                    duplicate_count += 1
-            
-            # Update statistics atomically for entire batch
-            total = len(events)
-            await conn.execute("""
-                UPDATE statistics SET stat_value = stat_value + $1, updated_at = CURRENT_TIMESTAMP
-                WHERE stat_key = 'received'
-            """, total)
+                    SELECT i.topic, i.event_id, i.timestamp, i.source, i.payload, CURRENT_TIMESTAMP
+                    FROM input i
+                    JOIN claimed c ON c.topic = i.topic AND c.event_id = i.event_id
+                    RETURNING topic, event_id
+                )
+                SELECT topic, event_id FROM inserted
+            """,
+                [e['topic'] for e in candidates],
+                [e['event_id'] for e in candidates],
+                [e['timestamp'] for e in candidates],
+                [e['source'] for e in candidates],
+                [e['payload'] for e in candidates],
+                worker_id,
+                [dedup_window_seconds(e['topic']) for e in candidates])
+            new_keys = {(row['topic'], row['event_id']) for row in new_rows}
+            topic_deltas = self._topic_deltas(
+                Counter(e['topic'] for e in events),
+                Counter(topic for topic, _ in new_keys)
+            )
+            new_count = len(new_keys)
+            duplicate_count = total - new_count
             
-            await conn.execute("""
-                UPDATE statistics SET stat_value = stat_value + $1, updated_at = CURRENT_TIMESTAMP
-                WHERE stat_key = 'unique_processed'
-            """, new_count)
+            # Step 2: Update statistics atomically for entire batch
+            if self.inline_stats:
+                await self._update_statistics(conn, total, new_count, duplicate_count, topic_deltas)
+        
+        if not self.inline_stats:
+            self.stats_buffer.add(total, new_count, duplicate_count, topic_deltas)
+        
+        await self._record_committed_keys(
+            [(e['topic'], e['event_id'], e['source']) for e in events] if self.audit_sink else [],
+            new_keys,
+            worker_id
+        )
+        
+        logger.info(f"Batch processed: {total} total, {new_count} new, {duplicate_count} duplicates")
+        
+        return total, new_count, duplicate_count, new_keys
+    
+    async def bulk_ingest_events(
+        self,
+        records: AsyncIterable[Tuple[str, str, datetime, str, str]],
+        worker_id: str = "api-bulk"
+    ) -> Tuple[int, int, int]:
+        """
+        Bulk ingest via COPY protocol untuk backfill berukuran sangat besar.
+        
+        Records (topic, event_id, timestamp, source, payload_json) di-stream
+        dengan copy_records_to_table ke temp staging table milik load ini
+        (ON COMMIT DROP, tanpa entry catalog permanen per load), lalu di-merge
+        ke processed_events dan events dengan satu statement dedup. Statistics
+        diupdate sekali per load. Seluruh load berjalan dalam satu
+        transaction: jika stream gagal, tidak ada yang tersimpan.
+        
+        Setelah commit, key baru masuk dedup cache dan pre-filter dan setiap
+        record dicatat ke audit sink, sama seperti batch_insert_events_atomic.
+        
+        Returns:
+            Tuple[int, int, int]: (total, new_count, duplicate_count)
+        """
+        staging_table = f"events_staging_{uuid.uuid4().hex}"
+        total = 0
+        received_per_topic: Counter = Counter()
+        # (topic, event_id, source) urut input, hanya untuk audit
+        audited: List[Tuple[str, str, str]] = []
+        
+        async def numbered():
+            nonlocal total
+            async for record in records:
+                total += 1
+                received_per_topic[record[0]] += 1
+                if self.audit_sink:
+                    audited.append((record[0], record[1], record[3]))
+                yield (total, *record, dedup_window_seconds(record[0]))
+        
+        async with self.transaction() as conn:
+            await conn.execute(f"""
+                CREATE TEMP TABLE {staging_table} (LIKE events_staging) ON COMMIT DROP
+            """)
             
-            await conn.execute("""
-                UPDATE statistics SET stat_value = stat_value + $1, updated_at = CURRENT_TIMESTAMP
-                WHERE stat_key = 'duplicate_dropped'
-            """, duplicate_count)
+            await conn.copy_records_to_table(
+                staging_table,
+                records=numbered(),
+                columns=['ord', 'topic', 'event_id', 'timestamp', 'source', 'payload',
+                         'dedup_window_seconds'],
+                timeout=settings.bulk_ingest_timeout_seconds
+            )
             
-            logger.info(f"Batch processed: {total} total, {new_count} new, {duplicate_count} duplicates")
+            # Dedup di dalam load (event pertama menang) dan terhadap events
+            new_rows = await conn.fetch(f"""
+                WITH input AS (
+                    SELECT DISTINCT ON (topic, event_id)
+                        topic, event_id, timestamp, source, payload::jsonb AS payload,
+                        dedup_window_seconds
+                    FROM {staging_table}
+                    ORDER BY topic, event_id, ord
+                ),
+                claimed AS (
+                    INSERT INTO processed_events (topic, event_id, worker_id, expires_at)
+                    SELECT topic, event_id, $1,
+                           CURRENT_TIMESTAMP + make_interval(secs => dedup_window_seconds)
+                    FROM input
+                    {_CLAIM_ON_CONFLICT}
+                    RETURNING topic, event_id
+                ),
+                inserted AS (
+                    INSERT INTO events (topic, event_id, timestamp, source, payload, processed_at)
+                    SELECT i.topic, i.event_id, i.timestamp, i.source, i.payload, CURRENT_TIMESTAMP
+                    FROM input i
+                    JOIN claimed c ON c.topic = i.topic AND c.event_id = i.event_id
+                    RETURNING topic, event_id
+                )
+                SELECT topic, event_id FROM inserted
+            """, worker_id, timeout=settings.bulk_ingest_timeout_seconds)
+            new_keys = {(row['topic'], row['event_id']) for row in new_rows}
+            topic_deltas = self._topic_deltas(
+                received_per_topic,
+                Counter(topic for topic, _ in new_keys)
+            )
+            new_count = len(new_keys)
+            duplicate_count = total - new_count
             
-            return total, new_count, duplicate_count
+            if self.inline_stats:
+                await self._update_statistics(conn, total, new_count, duplicate_count, topic_deltas)
+        
+        if not self.inline_stats:
+            self.stats_buffer.add(total, new_count, duplicate_count, topic_deltas)
+        
+        await self._record_committed_keys(audited, new_keys, worker_id)
+        
+        logger.info(f"Bulk load processed: {total} total, {new_count} new, {duplicate_count} duplicates")
+        
+        return total, new_count, duplicate_count
+    
+    async def _record_committed_keys(
+        self,
+        records: List[Tuple[str, str, str]],
+        new_keys: Set[Tuple[str, str]],
+        worker_id: str
+    ) -> None:
+        """
+        Langkah setelah commit batch/bulk insert.
+        
+        Key baru masuk dedup cache dan ditandai di pre-filter bersama agar
+        insert per-event (juga di replica lain) mengenalinya sebagai duplicate.
+        records (topic, event_id, source) urut input dicatat ke audit sink
+        seperti insert_event_once: kemunculan pertama key baru INSERT, sisanya
+        DUPLICATE (di-sample oleh audit sink).
+        """
+        if self.dedup_cache:
+            for topic, event_id in new_keys:
+                self.dedup_cache.add(topic, event_id, dedup_window_seconds(topic))
+        
+        if self.dedup_prefilter and new_keys:
+            await self.dedup_prefilter.mark(new_keys)
+        
+        if self.audit_sink:
+            pending_new = set(new_keys)
+            for topic, event_id, source in records:
+                if (topic, event_id) in pending_new:
+                    pending_new.discard((topic, event_id))
+                    self.audit_sink.record('INSERT', topic, event_id, {"source": source, "worker_id": worker_id})
+                else:
+                    self.audit_sink.record('DUPLICATE', topic, event_id, {"worker_id": worker_id})
+    
+    @staticmethod
+    def _topic_deltas(received_per_topic: Counter, new_per_topic: Dict[str, int]) -> TopicDeltas:
+        """Hitung (unique, duplicate) per topic dari jumlah input dan row baru per topic"""
+        return {
+            topic: (new_per_topic.get(topic, 0), received - new_per_topic.get(topic, 0))
+            for topic, received in received_per_topic.items()
+        }
+    
+    async def _update_statistics(
+        self,
+        conn: asyncpg.Connection,
+        received: int,
+        unique_processed: int,
+        duplicate_dropped: int,
+        topic_deltas: TopicDeltas
+    ) -> None:
+        """
+        Update counter statistics dan topic_stats dalam satu statement.
+        
+        Striped counter: slot dipilih dari backend PID koneksi sehingga
+        koneksi yang berbeda menulis ke row yang berbeda dan tidak saling
+        menunggu row lock. Counter dengan delta 0 dilewati. Topic diurutkan
+        agar urutan lock konsisten antar transaction.
+        """
+        topics = sorted(topic_deltas)
+        await conn.execute("""
+            WITH counters AS (
+                INSERT INTO statistics (stat_key, slot, stat_value)
+                SELECT stat_key, pg_backend_pid() % $4, delta
+                FROM unnest(
+                    ARRAY['received', 'unique_processed', 'duplicate_dropped']::varchar[],
+                    ARRAY[$1, $2, $3]::bigint[]
+                ) AS d(stat_key, delta)
+                WHERE delta <> 0
+                ON CONFLICT (stat_key, slot) DO UPDATE
+                SET stat_value = statistics.stat_value + EXCLUDED.stat_value,
+                    updated_at = CURRENT_TIMESTAMP
+            )
+            INSERT INTO topic_stats (topic, slot, unique_count, duplicate_count, last_seen)
+            SELECT topic, pg_backend_pid() % $4, unique_delta, duplicate_delta, CURRENT_TIMESTAMP
+            FROM unnest($5::varchar[], $6::bigint[], $7::bigint[])
+                 AS t(topic, unique_delta, duplicate_delta)
+            ON CONFLICT (topic, slot) DO UPDATE
+            SET unique_count = topic_stats.unique_count + EXCLUDED.unique_count,
+                duplicate_count = topic_stats.duplicate_count + EXCLUDED.duplicate_count,
+                last_seen = EXCLUDED.last_seen
+        """, received, unique_processed, duplicate_dropped, settings.stats_shard_count,
+            topics,
+            [topic_deltas[t][0] for t in topics],
+            [topic_deltas[t][1] for t in topics])
+    
+    async def _flush_statistics(
+        self,
+        received: int,
+        unique_processed: int,
+        duplicate_dropped: int,
+        topic_deltas: TopicDeltas
+    ) -> None:
+        """Flush delta dari write-behind buffer ke tabel statistics"""
+        async with self.pool.acquire() as conn:
+            await self._update_statistics(
+                conn, received, unique_processed, duplicate_dropped, topic_deltas
+            )
+    
+    async def _write_audit_records(self, records: List[AuditRecord]) -> None:
+        """Tulis batch audit record dengan satu multi-row insert"""
+        async with self.pool.acquire() as conn:
+            await conn.execute("""
+                INSERT INTO audit_log (operation, topic, event_id, details, created_at)
+                SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::varchar[],
+                                     $4::jsonb[], $5::timestamptz[])
+            """, *(list(column) for column in zip(*records)))
+    
+    async def flush_statistics(self) -> None:
+        """Flush delta statistics yang belum tersimpan (mode write_behind)"""
+        if self.stats_buffer and self.pool:
+            await self.stats_buffer.flush()
     
     async def get_events(
         self,
         topic: Optional[str] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        before: Optional[Tuple[datetime, int]] = None,
+        raw_payload: bool = False,
+        payload_equals: Optional[Dict[str, str]] = None,
+        payload_contains: Optional[Dict[str, Any]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        time_field: str = "timestamp"
     ) -> List[Dict[str, Any]]:
-        """Get events, optionally filtered by topic"""
-        async with self.pool.acquire() as conn:
-            if topic:
-                rows = await conn.fetch("""
-                    SELECT topic, event_id, timestamp, source, payload, received_at, processed_at
-                    FROM events
-                    WHERE topic = $1
-                    ORDER BY timestamp DESC
-                    LIMIT $2 OFFSET $3
-                """, topic, limit, offset)
-            else:
-                rows = await conn.fetch("""
-                    SELECT topic, event_id, timestamp, source, payload, received_at, processed_at
-                    FROM events
-                    ORDER BY timestamp DESC
-                    LIMIT $1 OFFSET $2
-                """, limit, offset)
+        """
+        Get events, optionally filtered by topic.
+        
+        Urutan: timestamp DESC, id DESC. Jika before=(timestamp, id) diberikan,
+        digunakan keyset pagination (WHERE (timestamp, id) < before) sehingga
+        halaman ke-N sama murahnya dengan halaman pertama; offset diabaikan.
+        
+        raw_payload=True mengembalikan payload sebagai teks JSON apa adanya
+        (tanpa decode) untuk diteruskan langsung ke response.
+        
+        Payload filter:
+        - payload_equals: {key: value}, payload->>'key' = value (expression index)
+        - payload_contains: objek JSON, payload @> objek (GIN jsonb_path_ops)
+        
+        Time window [since, until) pada time_field ('timestamp' atau
+        'received_at'; received_at juga memangkas partisi), index BRIN.
+        """
+        conditions = []
+        args: List[Any] = []
+        
+        if topic:
+            args.append(topic)
+            conditions.append(f"topic = ${len(args)}")
+        
+        for key, value in (payload_equals or {}).items():
+            if not PAYLOAD_KEY_PATTERN.match(key):
+                raise ValueError(f"Invalid payload key: {key}")
+            args.append(value)
+            conditions.append(f"payload->>'{key}' = ${len(args)}")
+        
+        if payload_contains:
+            args.append(payload_contains)
+            conditions.append(f"payload @> ${len(args)}::jsonb")
+        
+        if time_field not in TIME_FIELDS:
+            raise ValueError(f"Invalid time field: {time_field}")
+        if since is not None:
+            args.append(since)
+            conditions.append(f"{time_field} >= ${len(args)}")
+        if until is not None:
+            args.append(until)
+            conditions.append(f"{time_field} < ${len(args)}")
+        
+        if before is not None:
+            args.extend(before)
+            conditions.append(f"(timestamp, id) < (${len(args) - 1}, ${len(args)})")
+            offset = 0
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        args.extend([limit, offset])
+        
+        async with self.read_connection() as conn:
+            rows = await conn.fetch(f"""
+                SELECT id, topic, event_id, timestamp, source,
+                       {"payload::text AS payload" if raw_payload else "payload"},
+                       received_at, processed_at
+                FROM events
+                {where}
+                ORDER BY timestamp DESC, id DESC
+                LIMIT ${len(args) - 1} OFFSET ${len(args)}
+            """, *args)
             
             return [dict(row) for row in rows]
     
-    async def get_statistics(self) -> Dict[str, Any]:
-        """Get aggregated statistics"""
-        async with self.pool.acquire() as conn:
-            # Get basic stats
+    async def _read_counters(self) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """
+        Read persisted counters dan unique count per topic.
+        Keduanya menjumlahkan slot striped counter, O(jumlah topic) tanpa scan events.
+        
+        Dengan stats_buffer (write_behind) selalu dibaca dari primary: delta
+        lokal yang belum di-flush ditambahkan oleh snapshot dan dihapus begitu
+        flush commit di primary, sehingga replica yang belum me-replay flush
+        tersebut akan membuat counter mundur.
+        
+        Mode inline dibaca dari read replica jika sehat; counter bisa tertinggal
+        paling lama sebesar lag replica (replica_max_lag_seconds). Tanpa replica
+        (atau replica tidak sehat) hasilnya exact.
+        """
+        connection = self.pool.acquire() if self.stats_buffer else self.read_connection()
+        async with connection as conn:
             stats_rows = await conn.fetch("""
-                SELECT stat_key, stat_value FROM statistics
+                SELECT stat_key, SUM(stat_value)::BIGINT AS stat_value
+                FROM statistics
+                GROUP BY stat_key
             """)
-            stats = {row['stat_key']: row['stat_value'] for row in stats_rows}
-            
-            # Get unique topics
-            topics_rows = await conn.fetch("""
-                SELECT DISTINCT topic FROM events ORDER BY topic
+            topic_rows = await conn.fetch("""
+                SELECT topic, SUM(unique_count)::BIGINT AS unique_count
+                FROM topic_stats
+                GROUP BY topic
             """)
-            topics = [row['topic'] for row in topics_rows]
-            
-            # Get topic counts
-            topic_counts_rows = await conn.fetch("""
-                SELECT topic, COUNT(*) as count FROM events GROUP BY topic ORDER BY count DESC
-            """)
-            topic_counts = {row['topic']: row['count'] for row in topic_counts_rows}
-            
-            return {
-                'received': stats.get('received', 0),
-                'unique_processed': stats.get('unique_processed', 0),
-                'duplicate_dropped': stats.get('duplicate_dropped', 0),
-                'topics': topics,
-                'topic_counts': topic_counts
-            }
+            return (
+                {row['stat_key']: row['stat_value'] for row in stats_rows},
+                {row['topic']: row['unique_count'] for row in topic_rows}
+            )
+    
+    async def get_statistics(self) -> Dict[str, Any]:
+        """Get aggregated statistics"""
+        # Persisted + delta write-behind yang belum di-flush
+        if self.stats_buffer:
+            stats, unique_per_topic = await self.stats_buffer.snapshot(self._read_counters)
+        else:
+            stats, unique_per_topic = await self._read_counters()
+        
+        # Topic aktif = topic yang punya minimal satu event tersimpan
+        topic_counts = {
+            topic: count
+            for topic, count in sorted(unique_per_topic.items(), key=lambda item: -item[1])
+            if count > 0
+        }
+        topics = sorted(topic_counts)
+        
+        return {
+            'received': stats.get('received', 0),
+            'unique_processed': stats.get('unique_processed', 0),
+            'duplicate_dropped': stats.get('duplicate_dropped', 0),
+            'topics': topics,
+            'topic_counts': topic_counts
+        }
+    
+    async def get_window_statistics(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Unique event per topic yang diterima dalam window [since, until).
+        
+        Counter statistics tidak menyimpan waktu, sehingga window dihitung dari
+        events berdasarkan received_at (partition pruning + index BRIN).
+        Duplicate tidak disimpan di events dan tidak tersedia per window.
+        """
+        conditions = []
+        args: List[Any] = []
+        if since is not None:
+            args.append(since)
+            conditions.append(f"received_at >= ${len(args)}")
+        if until is not None:
+            args.append(until)
+            conditions.append(f"received_at < ${len(args)}")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        async with self.read_connection() as conn:
+            rows = await conn.fetch(f"""
+                SELECT topic, COUNT(*) AS count
+                FROM events
+                {where}
+                GROUP BY topic
+                ORDER BY count DESC, topic
+            """, *args)
+        
+        topic_counts = {row['topic']: row['count'] for row in rows}
+        return {
+            'since': since,
+            'until': until,
+            'unique_processed': sum(topic_counts.values()),
+            'topic_counts': topic_counts
+        }
     
     async def check_event_exists(self, topic: str, event_id: str) -> bool:
         """Check if event already exists (for pre-check deduplication)"""
-        async with self.pool.acquire() as conn:
+        async with self.read_connection() as conn:
             row = await conn.fetchrow("""
-                SELECT 1 FROM events WHERE topic = $1 AND event_id = $2
+                SELECT 1 FROM processed_events
+                WHERE topic = $1 AND event_id = $2
+                  AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
             """, topic, event_id)
             return row is not None
     
+    async def compact_dedup_keys(self) -> int:
+        """
+        Hapus dedup key yang sudah melewati dedup window.
+        
+        Dijalankan dalam batch kecil (dedup_compaction_batch_size, maksimal
+        dedup_compaction_max_batches per run), masing-masing transaction
+        sendiri, agar tidak menahan lock lama atau membuat WAL besar sekaligus.
+        Row yang sedang di-claim ulang oleh insert dilewati (SKIP LOCKED).
+        
+        Returns:
+            int: jumlah key yang dihapus
+        """
+        batch_size = settings.dedup_compaction_batch_size
+        removed = 0
+        for _ in range(settings.dedup_compaction_max_batches):
+            async with self.pool.acquire() as conn:
+                deleted = await conn.fetchval("""
+                    WITH expired AS (
+                        SELECT id FROM processed_events
+                        WHERE expires_at <= CURRENT_TIMESTAMP
+                        ORDER BY expires_at
+                        LIMIT $1
+                        FOR UPDATE SKIP LOCKED
+                    ),
+                    deleted AS (
+                        DELETE FROM processed_events p
+                        USING expired e
+                        WHERE p.id = e.id AND p.expires_at <= CURRENT_TIMESTAMP
+                        RETURNING 1
+                    )
+                    SELECT COUNT(*) FROM deleted
+                """, batch_size)
+            removed += deleted
+            if deleted < batch_size:
+                break
+        
+        if removed:
+            logger.info(f"Dedup compaction removed {removed} expired keys")
+        return removed
+    
+    async def maintain_partitions(self) -> Tuple[int, int]:
+        """
+        Buat partisi events ke depan dan drop partisi yang melewati retention.
+        
+        Returns:
+            Tuple[int, int]: (created, dropped)
+        """
+        async with self.pool.acquire() as conn:
+            created = await conn.fetchval(
+                "SELECT create_event_partitions($1, $2)",
+                settings.events_partition_interval,
+                settings.events_partitions_ahead
+            )
+            dropped = 0
+            if settings.events_retention_hours > 0:
+                dropped = await conn.fetchval("""
+                    SELECT drop_event_partitions(CURRENT_TIMESTAMP - make_interval(hours => $1))
+                """, settings.events_retention_hours)
+        
+        if created or dropped:
+            logger.info(f"Event partitions maintained: {created} created, {dropped} dropped")
+        return created, dropped
+    
+    async def _connect_replica(self) -> None:
+        """Initialize read replica connection pool"""
+        try:
+            self.read_pool = await asyncpg.create_pool(
+                settings.database_read_url,
+                min_size=settings.db_read_pool_min_size,
+                max_size=settings.db_read_pool_max_size,
+                command_timeout=60,
+                init=_init_connection
+            )
+            logger.info("Read replica connection pool established")
+        except Exception as e:
+            logger.error(f"Failed to connect to read replica: {e}")
+    
+    async def _check_replica(self) -> None:
+        """Update status replica: sehat jika bisa di-query dan lag <= replica_max_lag_seconds"""
+        if self.read_pool is None:
+            await self._connect_replica()
+        
+        healthy = False
+        if self.read_pool is not None:
+            try:
+                async with self.read_pool.acquire(timeout=settings.replica_check_interval_seconds) as conn:
+                    # Lag 0 jika bukan standby atau seluruh WAL yang diterima sudah di-replay
+                    lag = await conn.fetchval("""
+                        SELECT CASE
+                            WHEN NOT pg_is_in_recovery() THEN 0
+                            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                            ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                        END::FLOAT8
+                    """)
+                self.replica_lag_seconds = lag
+                healthy = lag <= settings.replica_max_lag_seconds
+            except Exception as e:
+                logger.error(f"Read replica health check failed: {e}")
+                self.replica_lag_seconds = None
+        
+        if healthy != self.replica_healthy:
+            if healthy:
+                logger.info("Read replica healthy, routing reads to replica")
+            else:
+                logger.warning(f"Read replica unhealthy (lag={self.replica_lag_seconds}), routing reads to primary")
+        self.replica_healthy = healthy
+    
+    async def _monitor_replica(self) -> None:
+        while True:
+            await asyncio.sleep(settings.replica_check_interval_seconds)
+            await self._check_replica()
+    
+    def pool_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Metrik connection pool per role (primary / replica)"""
+        def describe(pool: asyncpg.Pool) -> Dict[str, Any]:
+            return {
+                'size': pool.get_size(),
+                'idle': pool.get_idle_size(),
+                'min_size': pool.get_min_size(),
+                'max_size': pool.get_max_size()
+            }
+        
+        metrics = {}
+        if self.pool:
+            metrics['primary'] = describe(self.pool)
+        if settings.database_read_url:
+            replica = describe(self.read_pool) if self.read_pool else {}
+            replica['healthy'] = self.replica_healthy
+            replica['lag_seconds'] = self.replica_lag_seconds
+            metrics['replica'] = replica
+        return metrics
+    
     async def health_check(self) -> bool:
         """Check database connectivity"""
         try:
@@ -0,0 +1,78 @@
+"""
+Log Aggregator - Recent Key Cache
+Cache in-process (LRU + TTL) untuk key (topic, event_id) yang sudah commit
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class RecentKeyCache:
+    """
+    Bounded LRU cache dengan TTL untuk dedup key yang sudah tersimpan.
+    
+    Cache hanya berisi key yang pasti sudah ada di processed_events, sehingga
+    hit dapat langsung dijawab sebagai duplicate tanpa query database. Miss
+    tidak berarti event baru: tetap diputuskan oleh unique constraint di
+    database. Entry dibuang jika melewati TTL atau ketika cache penuh (key
+    yang paling lama tidak dipakai dibuang lebih dulu).
+    """
+    
+    def __init__(self, max_size: int = 100000, ttl_seconds: float = 300.0):
+        self._max_size = max_size
+        self._ttl = ttl_seconds
+        # key -> monotonic expiry
+        self._entries: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def contains(self, topic: str, event_id: str) -> bool:
+        """Cek key di cache (dihitung sebagai hit/miss)"""
+        key = (topic, event_id)
+        expires_at = self._entries.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            expires_at = None
+        
+        if expires_at is None:
+            self.misses += 1
+            return False
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return True
+    
+    def add(self, topic: str, event_id: str, ttl_seconds: Optional[float] = None) -> None:
+        """
+        Simpan key yang sudah commit. ttl_seconds membatasi TTL entry lebih
+        pendek dari TTL cache (misalnya sisa dedup window topic).
+        """
+        ttl = self._ttl if ttl_seconds is None else min(self._ttl, ttl_seconds)
+        key = (topic, event_id)
+        self._entries[key] = time.monotonic() + ttl
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self) -> None:
+        """Kosongkan cache (misalnya setelah data dihapus)"""
+        self._entries.clear()
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Ukuran cache dan counter hit/miss untuk /stats"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self._max_size,
+            'ttl_seconds': self._ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
@@ -0,0 +1,154 @@
+"""
+Log Aggregator - Shared Dedup Pre-filter
+Bloom filter time-bucketed di Redis, dipakai bersama oleh seluruh replica
+"""
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+class DedupPrefilter:
+    """
+    Bloom filter untuk dedup key (topic, event_id) yang disimpan sebagai
+    bitmap Redis (SETBIT/GETBIT), sehingga tidak membutuhkan modul RedisBloom.
+    
+    Filter dibagi per bucket waktu (bucket_seconds). Key ditandai di bucket
+    saat ini dan dicek di bucket saat ini serta bucket sebelumnya; bucket
+    lama expire sendiri, sehingga key diingat antara 1 dan 2 bucket dan
+    memory tetap terbatas (2 x bits / 8 byte).
+    
+    - "definitely new": minimal satu bit belum di-set, key belum pernah dilihat
+    - "maybe seen": probable duplicate, wajib dikonfirmasi ke PostgreSQL
+    
+    Mark dan cek dilakukan dalam satu pipeline (SETBIT mengembalikan bit lama).
+    Key ditandai sebelum insert commit; jika insert gagal, key hanya menjadi
+    false positive yang tetap dikonfirmasi ke database.
+    """
+    
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        key_prefix: str = "dedup_bloom",
+        bits: int = 8388608,
+        hashes: int = 7,
+        bucket_seconds: int = 3600
+    ):
+        self._redis = redis_client
+        self._key_prefix = key_prefix
+        self._bits = bits
+        self._hashes = hashes
+        self._bucket_seconds = bucket_seconds
+        self.checks = 0
+        self.definitely_new = 0
+        self.maybe_seen = 0
+        self.false_positives = 0
+        self.errors = 0
+    
+    def _bucket_key(self, bucket: int) -> str:
+        return f"{self._key_prefix}:{bucket}"
+    
+    def _positions(self, topic: str, event_id: str) -> List[int]:
+        """Posisi bit dengan double hashing (Kirsch-Mitzenmacher)"""
+        digest = hashlib.blake2b(f"{topic}\x00{event_id}".encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self._bits for i in range(self._hashes)]
+    
+    async def check_and_mark(self, topic: str, event_id: str) -> bool:
+        """
+        Tandai key dan kembalikan True jika key mungkin sudah pernah dilihat.
+        Jika Redis gagal, key diperlakukan sebagai baru (insert tetap
+        dilindungi unique constraint).
+        """
+        bucket = int(time.time()) // self._bucket_seconds
+        current, previous = self._bucket_key(bucket), self._bucket_key(bucket - 1)
+        positions = self._positions(topic, event_id)
+        
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for position in positions:
+                    pipe.setbit(current, position, 1)
+                for position in positions:
+                    pipe.getbit(previous, position)
+                pipe.expire(current, self._bucket_seconds * 2)
+                results = await pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Dedup pre-filter unavailable: {e}")
+            return False
+        
+        self.checks += 1
+        seen = all(results[:self._hashes]) or all(results[self._hashes:2 * self._hashes])
+        if seen:
+            self.maybe_seen += 1
+        else:
+            self.definitely_new += 1
+        return seen
+    
+    async def mark(self, keys: Iterable[Tuple[str, str]]) -> None:
+        """
+        Tandai banyak key sekaligus tanpa cek (key yang baru di-commit oleh
+        batch insert), dalam satu pipeline. Kegagalan Redis hanya di-log.
+        """
+        bucket = int(time.time()) // self._bucket_seconds
+        current = self._bucket_key(bucket)
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for topic, event_id in keys:
+                    for position in self._positions(topic, event_id):
+                        pipe.setbit(current, position, 1)
+                pipe.expire(current, self._bucket_seconds * 2)
+                await pipe.execute()
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Dedup pre-filter unavailable: {e}")
+    
+    def record_false_positive(self) -> None:
+        """Catat probable duplicate yang ternyata tidak ada di database"""
+        self.false_positives += 1
+    
+    async def clear(self) -> None:
+        """Hapus bucket yang masih aktif (misalnya setelah data dihapus)"""
+        bucket = int(time.time()) // self._bucket_seconds
+        await self._redis.delete(self._bucket_key(bucket), self._bucket_key(bucket - 1))
+    
+    async def metrics(self) -> Dict[str, Any]:
+        """Counter proses ini ditambah fill ratio dan memory filter bersama"""
+        bucket = int(time.time()) // self._bucket_seconds
+        keys = [self._bucket_key(bucket), self._bucket_key(bucket - 1)]
+        memory_bytes, fill_ratio = 0, 0.0
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.strlen(key)
+                pipe.bitcount(keys[0])
+                results = await pipe.execute()
+            memory_bytes = sum(results[:len(keys)])
+            fill_ratio = results[-1] / self._bits
+        except Exception as e:
+            logger.warning(f"Failed to read dedup pre-filter metrics: {e}")
+        
+        return {
+            'bits_per_bucket': self._bits,
+            'hashes': self._hashes,
+            'bucket_seconds': self._bucket_seconds,
+            'memory_bytes': memory_bytes,
+            'fill_ratio': fill_ratio,
+            # Probabilitas false positive bucket saat ini: fill_ratio ^ k
+            'estimated_false_positive_rate': fill_ratio ** self._hashes,
+            'checks': self.checks,
+            'definitely_new': self.definitely_new,
+            'maybe_seen': self.maybe_seen,
+            'false_positives': self.false_positives,
+            # Dari key yang ternyata baru, berapa bagian yang ditandai maybe seen
+            'observed_false_positive_rate': (
+                self.false_positives / (self.definitely_new + self.false_positives)
+                if self.definitely_new + self.false_positives else 0.0
+            ),
+            'errors': self.errors
+        }
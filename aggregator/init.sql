@@ -4,54 +4,113 @@
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
--- Create events table with unique constraint for deduplication
+-- Create events table, range-partitioned by received_at (daily/hourly).
+-- Unique constraint pada tabel partisi wajib memuat partition key, sehingga
+-- deduplication (topic, event_id) dijamin oleh processed_events (dedup store
+-- global, tidak dipartisi) yang di-insert lebih dulu oleh setiap insert path.
+-- Retention dilakukan dengan DROP partisi, bukan DELETE.
 CREATE TABLE IF NOT EXISTS events (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     topic VARCHAR(255) NOT NULL,
     event_id VARCHAR(255) NOT NULL,
     timestamp TIMESTAMPTZ NOT NULL,
     source VARCHAR(255) NOT NULL,
     payload JSONB NOT NULL DEFAULT '{}',
-    received_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    received_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
     processed_at TIMESTAMPTZ,
     
-    -- Unique constraint untuk deduplication (topic, event_id)
-    CONSTRAINT unique_topic_event UNIQUE (topic, event_id)
-);
+    PRIMARY KEY (id, received_at)
+) PARTITION BY RANGE (received_at);
+
+-- Default partition menampung row di luar partisi yang sudah dibuat
+CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT;
+
+-- Create index for faster queries.
+-- Composite (timestamp, id) dan (topic, timestamp, id) mendukung keyset pagination
+-- GET /events (ORDER BY timestamp DESC, id DESC) tanpa sort; index topic
+-- sudah tercakup oleh prefix idx_events_topic_timestamp_id.
+CREATE INDEX IF NOT EXISTS idx_events_timestamp_id ON events(timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_events_topic_timestamp_id ON events(topic, timestamp, id);
+
+-- Filter rentang waktu (since/until). Log bersifat append-mostly sehingga
+-- urutan fisik row berkorelasi dengan received_at (dan hampir selalu dengan
+-- timestamp); BRIN cukup menyimpan min/max per blok range, jauh lebih kecil
+-- dan murah di-maintain dibanding B-tree. Lihat benchmarks/bench_time_index.py.
+CREATE INDEX IF NOT EXISTS idx_events_received_at_brin ON events USING BRIN (received_at);
+CREATE INDEX IF NOT EXISTS idx_events_timestamp_brin ON events USING BRIN (timestamp);
 
--- Create index for faster queries
-CREATE INDEX IF NOT EXISTS idx_events_topic ON events(topic);
-CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events(timestamp);
-CREATE INDEX IF NOT EXISTS idx_events_received_at ON events(received_at);
+-- Payload filters GET /events: GIN jsonb_path_ops untuk containment (payload @> ...)
+-- dan expression index untuk key yang sering difilter (payload->>'key' = ...).
+-- Key lain dapat ditambahkan dengan SELECT create_payload_key_index('key').
+CREATE INDEX IF NOT EXISTS idx_events_payload ON events USING GIN (payload jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_events_payload_level ON events ((payload->>'level'));
+CREATE INDEX IF NOT EXISTS idx_events_payload_user_id ON events ((payload->>'user_id'));
 
--- Create processed_events table for tracking processed events (dedup store)
+-- Create processed_events table for tracking processed events (dedup store).
+-- Sumber kebenaran deduplication: key di-claim di sini sebelum insert ke events.
 CREATE TABLE IF NOT EXISTS processed_events (
     id SERIAL PRIMARY KEY,
     topic VARCHAR(255) NOT NULL,
     event_id VARCHAR(255) NOT NULL,
     processed_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
     worker_id VARCHAR(100),
+    -- Akhir dedup window key ini (NULL = tidak pernah expire). Key yang sudah
+    -- expire boleh di-claim ulang dan dihapus bertahap oleh compaction.
+    expires_at TIMESTAMPTZ,
     
     -- Unique constraint untuk idempotent processing
     CONSTRAINT unique_processed_event UNIQUE (topic, event_id)
 );
 
 CREATE INDEX IF NOT EXISTS idx_processed_topic ON processed_events(topic);
+CREATE INDEX IF NOT EXISTS idx_processed_expires_at ON processed_events(expires_at)
+    WHERE expires_at IS NOT NULL;
 
--- Create statistics table for atomic counter updates
+-- Create statistics table for atomic counter updates.
+-- Striped counter: setiap stat_key punya beberapa slot sehingga writer yang
+-- berbeda tidak antre pada row lock yang sama. Nilai counter = SUM(stat_value).
 CREATE TABLE IF NOT EXISTS statistics (
     id SERIAL PRIMARY KEY,
-    stat_key VARCHAR(100) UNIQUE NOT NULL,
+    stat_key VARCHAR(100) NOT NULL,
+    slot INT NOT NULL DEFAULT 0,
     stat_value BIGINT DEFAULT 0,
-    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    
+    CONSTRAINT unique_stat_slot UNIQUE (stat_key, slot)
 );
 
--- Initialize statistics
-INSERT INTO statistics (stat_key, stat_value) VALUES 
-    ('received', 0),
-    ('unique_processed', 0),
-    ('duplicate_dropped', 0)
-ON CONFLICT (stat_key) DO NOTHING;
+-- Initialize statistics (16 slot per key, slot lain dibuat otomatis via upsert)
+INSERT INTO statistics (stat_key, slot, stat_value)
+SELECT k.stat_key, s.slot, 0
+FROM (VALUES ('received'), ('unique_processed'), ('duplicate_dropped')) AS k(stat_key)
+CROSS JOIN generate_series(0, 15) AS s(slot)
+ON CONFLICT (stat_key, slot) DO NOTHING;
+
+-- Per-topic counters, dijaga incremental oleh insert path (striped seperti statistics).
+-- /stats membaca tabel ini alih-alih COUNT(*) GROUP BY pada events.
+CREATE TABLE IF NOT EXISTS topic_stats (
+    topic VARCHAR(255) NOT NULL,
+    slot INT NOT NULL DEFAULT 0,
+    unique_count BIGINT NOT NULL DEFAULT 0,
+    duplicate_count BIGINT NOT NULL DEFAULT 0,
+    last_seen TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    
+    PRIMARY KEY (topic, slot)
+);
+
+-- Unlogged staging table template untuk bulk ingest via COPY.
+-- Setiap load membuat temp table sendiri dengan (LIKE events_staging) ON COMMIT
+-- DROP, sehingga load paralel tidak saling mengganggu dan tidak ada tabel
+-- permanen yang dibuat/di-drop per load.
+CREATE UNLOGGED TABLE IF NOT EXISTS events_staging (
+    ord BIGINT NOT NULL,
+    topic VARCHAR(255) NOT NULL,
+    event_id VARCHAR(255) NOT NULL,
+    timestamp TIMESTAMPTZ NOT NULL,
+    source VARCHAR(255) NOT NULL,
+    payload TEXT NOT NULL,
+    dedup_window_seconds DOUBLE PRECISION
+);
 
 -- Create audit_log table for tracking all operations
 CREATE TABLE IF NOT EXISTS audit_log (
@@ -80,45 +139,155 @@ CREATE TABLE IF NOT EXISTS outbox (
 
 CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status);
 
--- Function to atomically increment statistics
-CREATE OR REPLACE FUNCTION increment_stat(key_name VARCHAR, increment_by BIGINT DEFAULT 1)
+-- Function to atomically increment statistics (slot-aware).
+-- Returns total value of the key across all slots.
+CREATE OR REPLACE FUNCTION increment_stat(key_name VARCHAR, increment_by BIGINT DEFAULT 1, slot_id INT DEFAULT 0)
 RETURNS BIGINT AS $$
 DECLARE
     new_value BIGINT;
 BEGIN
-    UPDATE statistics 
-    SET stat_value = stat_value + increment_by,
-        updated_at = CURRENT_TIMESTAMP
-    WHERE stat_key = key_name
-    RETURNING stat_value INTO new_value;
+    INSERT INTO statistics (stat_key, slot, stat_value)
+    VALUES (key_name, slot_id, increment_by)
+    ON CONFLICT (stat_key, slot) DO UPDATE
+    SET stat_value = statistics.stat_value + EXCLUDED.stat_value,
+        updated_at = CURRENT_TIMESTAMP;
+    
+    SELECT SUM(stat_value)::BIGINT INTO new_value
+    FROM statistics
+    WHERE stat_key = key_name;
     
     RETURN new_value;
 END;
 $$ LANGUAGE plpgsql;
 
--- Function for idempotent event insert (returns true if new, false if duplicate)
-CREATE OR REPLACE FUNCTION insert_event_idempotent(
-    p_topic VARCHAR,
-    p_event_id VARCHAR,
-    p_timestamp TIMESTAMPTZ,
-    p_source VARCHAR,
-    p_payload JSONB
-) RETURNS BOOLEAN AS $$
+-- One-off backfill topic_stats dari data yang sudah ada.
+-- unique_count dari events, duplicate_count dari audit_log (operation = 'DUPLICATE').
+-- Jalankan saat ingest berhenti: delta write-behind yang belum di-flush akan
+-- ditambahkan lagi di atas hasil backfill.
+-- duplicate_count hanya exact jika audit tidak di-sample (AUDIT_ENABLED=true,
+-- AUDIT_DUPLICATE_SAMPLE_RATE=1.0) sejak data pertama masuk dan tidak ada
+-- audit record yang hilang (buffer penuh/crash). Dengan sampling, duplicate
+-- per topic menjadi lebih kecil dari sebenarnya; counter global
+-- duplicate_dropped di statistics tidak terpengaruh backfill.
+CREATE OR REPLACE FUNCTION backfill_topic_stats()
+RETURNS INTEGER AS $$
+DECLARE
+    topic_total INTEGER;
+BEGIN
+    LOCK TABLE topic_stats IN EXCLUSIVE MODE;
+    DELETE FROM topic_stats;
+    
+    INSERT INTO topic_stats (topic, slot, unique_count, duplicate_count, last_seen)
+    SELECT topic, 0, SUM(unique_count), SUM(duplicate_count), MAX(last_seen)
+    FROM (
+        SELECT topic, COUNT(*) AS unique_count, 0 AS duplicate_count, MAX(received_at) AS last_seen
+        FROM events
+        GROUP BY topic
+        UNION ALL
+        SELECT topic, 0, COUNT(*), MAX(created_at)
+        FROM audit_log
+        WHERE operation = 'DUPLICATE' AND topic IS NOT NULL
+        GROUP BY topic
+    ) counts
+    GROUP BY topic;
+    
+    GET DIAGNOSTICS topic_total = ROW_COUNT;
+    RETURN topic_total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create expression index for a hot top-level payload key (payload->>'key').
+CREATE OR REPLACE FUNCTION create_payload_key_index(p_key TEXT)
+RETURNS VOID AS $$
+BEGIN
+    IF p_key !~ '^[A-Za-z0-9_-]{1,64}$' THEN
+        RAISE EXCEPTION 'Invalid payload key: %', p_key;
+    END IF;
+    
+    EXECUTE format(
+        'CREATE INDEX IF NOT EXISTS %I ON events ((payload->>%L))',
+        'idx_events_payload_' || lower(replace(p_key, '-', '_')),
+        p_key
+    );
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create partitions for events from the current period up to p_ahead periods ahead.
+-- p_interval: 'daily' atau 'hourly'. Partisi yang rentangnya sudah tercakup
+-- (misalnya setelah interval diganti) dilewati.
+CREATE OR REPLACE FUNCTION create_event_partitions(p_interval TEXT DEFAULT 'daily', p_ahead INT DEFAULT 3)
+RETURNS INTEGER AS $$
 DECLARE
-    inserted BOOLEAN := FALSE;
+    step INTERVAL := CASE p_interval WHEN 'hourly' THEN INTERVAL '1 hour' ELSE INTERVAL '1 day' END;
+    name_format TEXT := CASE p_interval WHEN 'hourly' THEN 'YYYYMMDD"_"HH24' ELSE 'YYYYMMDD' END;
+    period_start TIMESTAMP;
+    partition_name TEXT;
+    created INTEGER := 0;
 BEGIN
-    -- Try to insert, catch unique violation
-    INSERT INTO events (topic, event_id, timestamp, source, payload)
-    VALUES (p_topic, p_event_id, p_timestamp, p_source, p_payload)
-    ON CONFLICT (topic, event_id) DO NOTHING;
+    -- Serialisasi antar replica yang menjalankan maintenance bersamaan
+    PERFORM pg_advisory_xact_lock(hashtext('events_partitions'));
     
-    -- Check if insert happened
-    GET DIAGNOSTICS inserted = ROW_COUNT;
+    period_start := date_trunc(
+        CASE p_interval WHEN 'hourly' THEN 'hour' ELSE 'day' END,
+        CURRENT_TIMESTAMP AT TIME ZONE 'UTC'
+    );
     
-    RETURN inserted > 0;
+    FOR i IN 0..p_ahead LOOP
+        partition_name := 'events_p' || to_char(period_start + step * i, name_format);
+        CONTINUE WHEN to_regclass(partition_name) IS NOT NULL;
+        
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF events FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                (period_start + step * i) AT TIME ZONE 'UTC',
+                (period_start + step * (i + 1)) AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        EXCEPTION
+            WHEN invalid_object_definition OR check_violation THEN
+                -- Rentang overlap dengan partisi lain atau row sudah ada di default
+                RAISE NOTICE 'Skipping partition %: %', partition_name, SQLERRM;
+        END;
+    END LOOP;
+    
+    RETURN created;
 END;
 $$ LANGUAGE plpgsql;
 
+-- Retention: drop seluruh partisi events yang batas atasnya <= p_older_than.
+-- Dedup key di processed_events tidak ikut dihapus.
+CREATE OR REPLACE FUNCTION drop_event_partitions(p_older_than TIMESTAMPTZ)
+RETURNS INTEGER AS $$
+DECLARE
+    part RECORD;
+    upper_bound TIMESTAMPTZ;
+    dropped INTEGER := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('events_partitions'));
+    
+    FOR part IN
+        SELECT c.oid::regclass AS partition_name, pg_get_expr(c.relpartbound, c.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'events'::regclass
+    LOOP
+        CONTINUE WHEN part.bound = 'DEFAULT';
+        
+        upper_bound := substring(part.bound FROM 'TO \(''([^'']+)''\)')::TIMESTAMPTZ;
+        IF upper_bound <= p_older_than THEN
+            EXECUTE format('DROP TABLE %s', part.partition_name);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Initial partitions (aggregator membuat partisi berikutnya secara berkala)
+SELECT create_event_partitions('daily', 3);
+
 -- Grant permissions
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO aggregator_user;
 GRANT ALL PRIVILEGES ON ALL SEQUENCES IN SCHEMA public TO aggregator_user;
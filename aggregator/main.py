@@ -3,24 +3,27 @@ Log Aggregator - Main Application
 FastAPI application with Pub-Sub log aggregation, idempotency, and deduplication
 """
 import asyncio
+import base64
 import logging
-import os
 import uuid
-from datetime import datetime, timedelta
-from typing import Optional, List
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Literal, Tuple
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Query, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Depends, BackgroundTasks, Request
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+import codec
 from config import get_settings
 from models import (
-    Event, BatchEvents, PublishResponse, BatchPublishResponse,
+    Event, BatchEvents, PublishResponse, BatchPublishResponse, QueueBatchResponse,
     EventResponse, EventsListResponse, StatsResponse, HealthResponse, ErrorResponse
 )
-from database import Database, get_database, db
+from database import Database, get_database, db, dedup_window_enabled, PAYLOAD_KEY_PATTERN
 from broker import Broker, get_broker, broker
+from admission import AdmissionController
+from worker import worker_tasks, start_workers, stop_workers, attach_dedup_prefilter
 
 # Configure logging
 logging.basicConfig(
@@ -34,63 +37,37 @@ settings = get_settings()
 # Track application start time for uptime calculation
 START_TIME = datetime.utcnow()
 
-# Worker tasks
-worker_tasks: List[asyncio.Task] = []
+# Partition maintenance task
+maintenance_task: Optional[asyncio.Task] = None
+compaction_task: Optional[asyncio.Task] = None
+admission: Optional[AdmissionController] = None
 
 
-async def process_event_from_queue(event_data: dict) -> None:
-    """
-    Process event from queue with idempotent insert.
-    This function is called by background workers.
-    """
-    try:
-        await db.insert_event_idempotent(
-            topic=event_data['topic'],
-            event_id=event_data['event_id'],
-            timestamp=datetime.fromisoformat(event_data['timestamp'].replace('Z', '+00:00')) 
-                if isinstance(event_data['timestamp'], str) else event_data['timestamp'],
-            source=event_data['source'],
-            payload=event_data.get('payload', {}),
-            worker_id=f"worker-{os.getpid()}"
-        )
-    except Exception as e:
-        logger.error(f"Error processing event from queue: {e}")
-        raise
-
-
-async def start_workers(count: int = 4) -> None:
-    """Start background worker tasks"""
-    global worker_tasks
-    
-    for i in range(count):
-        task = asyncio.create_task(
-            broker.start_worker(process_event_from_queue, f"worker-{i+1}")
-        )
-        worker_tasks.append(task)
-    
-    logger.info(f"Started {count} background workers")
+async def partition_maintenance_loop() -> None:
+    """Buat partisi events ke depan dan jalankan retention secara berkala"""
+    while True:
+        await asyncio.sleep(settings.partition_maintenance_interval_seconds)
+        try:
+            await db.maintain_partitions()
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
 
 
-async def stop_workers() -> None:
-    """Stop all background workers"""
-    global worker_tasks
-    
-    broker.stop_workers()
-    
-    for task in worker_tasks:
-        task.cancel()
+async def dedup_compaction_loop() -> None:
+    """Hapus dedup key yang melewati dedup window secara berkala"""
+    while True:
+        await asyncio.sleep(settings.dedup_compaction_interval_seconds)
         try:
-            await task
-        except asyncio.CancelledError:
-            pass
-    
-    worker_tasks.clear()
-    logger.info("All workers stopped")
+            await db.compact_dedup_keys()
+        except Exception as e:
+            logger.error(f"Dedup compaction failed: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan management"""
+    global maintenance_task, compaction_task, admission
+    
     # Startup
     logger.info("Starting Log Aggregator...")
     
@@ -98,30 +75,64 @@ async def lifespan(app: FastAPI):
         await db.connect()
         await broker.connect()
         
+        attach_dedup_prefilter()
+        
+        if settings.admission_enabled:
+            admission = AdmissionController(
+                broker.get_queue_size,
+                db.pool_wait,
+                queue_high=settings.admission_queue_high,
+                queue_low=settings.admission_queue_low,
+                pool_wait_high_ms=settings.admission_pool_wait_high_ms,
+                pool_wait_low_ms=settings.admission_pool_wait_low_ms,
+                sample_interval_seconds=settings.admission_sample_interval_seconds,
+                retry_after_max_seconds=settings.admission_retry_after_max_seconds
+            )
+        
+        # Pastikan partisi events tersedia sebelum menerima event
+        await db.maintain_partitions()
+        maintenance_task = asyncio.create_task(partition_maintenance_loop())
+        if dedup_window_enabled():
+            compaction_task = asyncio.create_task(dedup_compaction_loop())
+        
         # Start workers if not in worker mode
         if not settings.worker_mode:
             await start_workers(settings.worker_count)
         else:
-            # Worker mode - only process queue
-            await start_workers(settings.worker_count)
+            # Worker mode - queue diproses oleh runtime standalone (python worker.py)
+            logger.info("Worker mode: in-process workers disabled, queue drained by worker.py")
         
         logger.info("Log Aggregator started successfully")
         yield
     finally:
         # Shutdown
         logger.info("Shutting down Log Aggregator...")
+        if maintenance_task:
+            maintenance_task.cancel()
+        if compaction_task:
+            compaction_task.cancel()
         await stop_workers()
+        # Flush delta statistics write-behind sebelum pool ditutup
+        await db.flush_statistics()
         await broker.disconnect()
         await db.disconnect()
         logger.info("Log Aggregator shutdown complete")
 
 
+class AggregatorJSONResponse(ORJSONResponse):
+    """ORJSONResponse dengan fallback json untuk payload di luar jangkauan orjson (integer > 64-bit)"""
+    
+    def render(self, content) -> bytes:
+        return codec.dumps_response(content)
+
+
 # Create FastAPI application
 app = FastAPI(
     title="Log Aggregator",
     description="Distributed Pub-Sub Log Aggregator with Idempotent Consumer and Deduplication",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=AggregatorJSONResponse
 )
 
 # Add CORS middleware
@@ -134,6 +145,32 @@ app.add_middleware(
 )
 
 
+# ==================== Admission Control ====================
+
+async def admit_to_queue() -> None:
+    """Tolak publish ke queue (429) selama backlog queue di atas watermark"""
+    if admission:
+        retry_after = await admission.check_queue()
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="Queue backlog above watermark, retry later",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+
+async def admit_to_database() -> None:
+    """Tolak publish langsung ke database (503) selama pool connection jenuh"""
+    if admission:
+        retry_after = admission.check_pool()
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=503,
+                detail="Database pool saturated, retry later",
+                headers={"Retry-After": str(retry_after)}
+            )
+
+
 # ==================== API Endpoints ====================
 
 @app.get("/health", response_model=HealthResponse, tags=["Health"])
@@ -149,16 +186,30 @@ async def health_check():
     
     status = "healthy" if (db_healthy and broker_healthy) else "unhealthy"
     
+    replica = None
+    if settings.database_read_url:
+        replica = "healthy" if db.replica_healthy else "unhealthy"
+    
+    if admission:
+        await admission.refresh()
+    
     return HealthResponse(
         status=status,
         database="connected" if db_healthy else "disconnected",
         broker="connected" if broker_healthy else "disconnected",
+        replica=replica,
+        admission=admission.state if admission else None,
         uptime_seconds=uptime,
         version=settings.app_version
     )
 
 
-@app.post("/publish", response_model=PublishResponse, tags=["Events"])
+@app.post(
+    "/publish",
+    response_model=PublishResponse,
+    tags=["Events"],
+    dependencies=[Depends(admit_to_database)]
+)
 async def publish_event(event: Event, database: Database = Depends(get_database)):
     """
     Publish single event ke aggregator.
@@ -193,9 +244,15 @@ async def publish_event(event: Event, database: Database = Depends(get_database)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/publish/batch", response_model=BatchPublishResponse, tags=["Events"])
+@app.post(
+    "/publish/batch",
+    response_model=BatchPublishResponse,
+    tags=["Events"],
+    dependencies=[Depends(admit_to_database)]
+)
 async def publish_batch_events(
     batch: BatchEvents,
+    details: bool = Query(False, description="Sertakan status per event di field details"),
     database: Database = Depends(get_database)
 ):
     """
@@ -205,6 +262,8 @@ async def publish_batch_events(
     - Seluruh batch diproses dalam satu transaction
     - Jika ada error, seluruh batch di-rollback
     - Deduplication tetap berlaku untuk setiap event
+    - Duplikat di dalam batch diciutkan sebelum dikirim ke database
+    - details=true: status per event (urutan sama dengan request)
     
     Isolation Level: READ COMMITTED
     Pattern: Batch Atomic Insert
@@ -221,24 +280,106 @@ async def publish_batch_events(
             for e in batch.events
         ]
         
-        total, new_count, duplicate_count = await database.batch_insert_events_atomic(
+        total, new_count, duplicate_count, new_keys = await database.batch_insert_events_atomic(
             events_data,
             worker_id="api-batch"
         )
         
+        event_details = []
+        if details:
+            received_at = datetime.utcnow()
+            for e in batch.events:
+                # Hanya kemunculan pertama key baru yang disimpan
+                is_new = (e.topic, e.event_id) in new_keys
+                new_keys.discard((e.topic, e.event_id))
+                event_details.append(PublishResponse(
+                    success=True,
+                    message="Event processed successfully" if is_new else "Duplicate event ignored",
+                    event_id=e.event_id,
+                    is_duplicate=not is_new,
+                    received_at=received_at
+                ))
+        
         return BatchPublishResponse(
             success=True,
             total_received=total,
             unique_processed=new_count,
             duplicates_dropped=duplicate_count,
-            failed=0
+            failed=0,
+            details=event_details
         )
     except Exception as e:
         logger.error(f"Failed to publish batch: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/publish/queue", response_model=PublishResponse, tags=["Events"])
+def parse_bulk_line(line: bytes, line_no: int) -> tuple:
+    """Validate satu baris NDJSON menjadi record untuk COPY"""
+    try:
+        event = Event.model_validate_json(line)
+    except ValueError as e:
+        raise ValueError(f"Invalid event at line {line_no}: {e}")
+    return (event.topic, event.event_id, event.timestamp, event.source, codec.dumps(event.payload))
+
+
+@app.post(
+    "/publish/bulk",
+    response_model=BatchPublishResponse,
+    tags=["Events"],
+    dependencies=[Depends(admit_to_database)]
+)
+async def publish_bulk_events(request: Request, database: Database = Depends(get_database)):
+    """
+    Bulk ingest event dalam format NDJSON (satu event JSON per baris).
+    
+    Ditujukan untuk replay/backfill berukuran sangat besar:
+    - Request body di-stream, tidak dibatasi 1000 event seperti /publish/batch
+    - Event dikirim ke PostgreSQL dengan COPY protocol ke unlogged staging table
+    - Merge ke events dengan satu statement ON CONFLICT DO NOTHING
+    - Deduplication (topic, event_id) tetap berlaku, termasuk di dalam load
+    - Jika ada baris yang tidak valid, seluruh load di-rollback (422)
+    
+    Pattern: COPY + Staging Merge
+    """
+    async def records():
+        line_no = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_no += 1
+                if line.strip():
+                    yield parse_bulk_line(line, line_no)
+        if buffer.strip():
+            yield parse_bulk_line(buffer, line_no + 1)
+    
+    try:
+        total, new_count, duplicate_count = await database.bulk_ingest_events(
+            records(),
+            worker_id="api-bulk"
+        )
+        
+        return BatchPublishResponse(
+            success=True,
+            total_received=total,
+            unique_processed=new_count,
+            duplicates_dropped=duplicate_count,
+            failed=0
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to ingest bulk load: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post(
+    "/publish/queue",
+    response_model=PublishResponse,
+    tags=["Events"],
+    dependencies=[Depends(admit_to_queue)]
+)
 async def publish_to_queue(event: Event, broker_inst: Broker = Depends(get_broker)):
     """
     Publish event ke message queue untuk async processing.
@@ -252,7 +393,7 @@ async def publish_to_queue(event: Event, broker_inst: Broker = Depends(get_broke
         event_data = {
             'topic': event.topic,
             'event_id': event.event_id,
-            'timestamp': event.timestamp.isoformat(),
+            'timestamp': event.timestamp,
             'source': event.source,
             'payload': event.payload
         }
@@ -276,11 +417,112 @@ async def publish_to_queue(event: Event, broker_inst: Broker = Depends(get_broke
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post(
+    "/publish/queue/batch",
+    response_model=QueueBatchResponse,
+    tags=["Events"],
+    dependencies=[Depends(admit_to_queue)]
+)
+async def publish_batch_to_queue(batch: BatchEvents, broker_inst: Broker = Depends(get_broker)):
+    """
+    Publish batch event ke message queue untuk async processing.
+    
+    Seluruh batch dikirim dalam satu round trip (satu LPUSH variadic, atau
+    pipeline XADD untuk backend stream) dan response dikembalikan segera
+    setelah Redis menerima. Deduplication dilakukan oleh worker.
+    """
+    try:
+        events_data = [
+            {
+                'topic': event.topic,
+                'event_id': event.event_id,
+                'timestamp': event.timestamp,
+                'source': event.source,
+                'payload': event.payload
+            }
+            for event in batch.events
+        ]
+        
+        queued = await broker_inst.publish_batch(events_data)
+        if queued != len(events_data):
+            raise HTTPException(status_code=500, detail="Failed to queue batch")
+        
+        return QueueBatchResponse(
+            success=True,
+            message="Batch queued for processing",
+            queued=queued,
+            received_at=datetime.utcnow()
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to queue batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Encode posisi (timestamp, id) menjadi opaque cursor"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode opaque cursor menjadi (timestamp, id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def normalize_time_window(
+    since: Optional[datetime],
+    until: Optional[datetime]
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Validasi time window since/until; waktu tanpa timezone dianggap UTC"""
+    since, until = (
+        value.replace(tzinfo=timezone.utc) if value and value.tzinfo is None else value
+        for value in (since, until)
+    )
+    if since and until and since >= until:
+        raise ValueError("since must be earlier than until")
+    return since, until
+
+
+def parse_payload_eq(filters: List[str]) -> dict:
+    """Parse filter payload_eq (key:value) menjadi {key: value}"""
+    parsed = {}
+    for item in filters:
+        key, sep, value = item.partition(":")
+        if not sep or not PAYLOAD_KEY_PATTERN.match(key):
+            raise ValueError(f"Invalid payload_eq filter: {item}")
+        parsed[key] = value
+    return parsed
+
+
+def parse_payload_contains(value: str) -> dict:
+    """Parse filter payload_contains (objek JSON)"""
+    try:
+        parsed = codec.loads(value)
+    except ValueError:
+        raise ValueError("payload_contains must be valid JSON")
+    if not isinstance(parsed, dict):
+        raise ValueError("payload_contains must be a JSON object")
+    return parsed
+
+
 @app.get("/events", response_model=EventsListResponse, tags=["Events"])
 async def get_events(
     topic: Optional[str] = Query(None, description="Filter by topic"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum events to return"),
     offset: int = Query(0, ge=0, description="Offset for pagination"),
+    cursor: Optional[str] = Query(None, description="Cursor dari next_cursor (keyset pagination)"),
+    payload_eq: List[str] = Query([], description="Filter equality top-level payload key, format key:value"),
+    payload_contains: Optional[str] = Query(None, description="Filter containment payload, objek JSON"),
+    since: Optional[datetime] = Query(None, description="Awal time window (inklusif)"),
+    until: Optional[datetime] = Query(None, description="Akhir time window (eksklusif)"),
+    time_field: Literal["timestamp", "received_at"] = Query("timestamp", description="Kolom waktu untuk since/until"),
     database: Database = Depends(get_database)
 ):
     """
@@ -288,11 +530,61 @@ async def get_events(
     
     Features:
     - Filter by topic (optional)
-    - Pagination with limit/offset
+    - Keyset pagination dengan cursor (next_cursor dari response sebelumnya)
+    - Pagination with limit/offset (compatibility; diabaikan jika cursor diberikan)
     - Returns only unique, processed events
+    - Filter payload: payload_eq=level:ERROR (bisa diulang) dan
+      payload_contains={"context": {"region": "eu"}}
+    - Time window since/until pada timestamp (default) atau received_at
+    - PAYLOAD_PASSTHROUGH: payload diteruskan sebagai raw JSON dari database
     """
     try:
-        events = await database.get_events(topic=topic, limit=limit, offset=offset)
+        since, until = normalize_time_window(since, until)
+        before = decode_cursor(cursor) if cursor else None
+        payload_equals = parse_payload_eq(payload_eq)
+        contains = parse_payload_contains(payload_contains) if payload_contains else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # Ambil satu row ekstra untuk mengetahui apakah masih ada halaman berikutnya
+        events = await database.get_events(
+            topic=topic, limit=limit + 1, offset=offset, before=before,
+            raw_payload=settings.payload_passthrough,
+            payload_equals=payload_equals,
+            payload_contains=contains,
+            since=since,
+            until=until,
+            time_field=time_field
+        )
+        has_more = len(events) > limit
+        events = events[:limit]
+        
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(events[-1]['timestamp'], events[-1]['id'])
+        
+        if settings.payload_passthrough:
+            # Payload tidak di-decode maupun divalidasi ulang, langsung disisipkan
+            body = {
+                'success': True,
+                'topic': topic,
+                'count': len(events),
+                'events': [
+                    {
+                        'topic': e['topic'],
+                        'event_id': e['event_id'],
+                        'timestamp': e['timestamp'],
+                        'source': e['source'],
+                        'payload': codec.raw(e['payload']),
+                        'received_at': e['received_at'],
+                        'processed_at': e['processed_at']
+                    }
+                    for e in events
+                ],
+                'next_cursor': next_cursor
+            }
+            return Response(content=codec.dumps_response(body), media_type="application/json")
         
         event_responses = [
             EventResponse(
@@ -311,7 +603,8 @@ async def get_events(
             success=True,
             topic=topic,
             count=len(event_responses),
-            events=event_responses
+            events=event_responses,
+            next_cursor=next_cursor
         )
     except Exception as e:
         logger.error(f"Failed to get events: {e}")
@@ -320,6 +613,8 @@ async def get_events(
 
 @app.get("/stats", response_model=StatsResponse, tags=["Statistics"])
 async def get_stats(
+    since: Optional[datetime] = Query(None, description="Awal time window received_at (inklusif)"),
+    until: Optional[datetime] = Query(None, description="Akhir time window received_at (eksklusif)"),
     database: Database = Depends(get_database),
     broker_inst: Broker = Depends(get_broker)
 ):
@@ -334,10 +629,21 @@ async def get_stats(
     - topic_counts: Event count per topic
     - uptime: Service uptime
     - queue_size: Current message queue size
+    - window: unique events per topic dalam since/until (jika diberikan)
     """
+    try:
+        since, until = normalize_time_window(since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         stats = await database.get_statistics()
+        window = None
+        if since or until:
+            window = await database.get_window_statistics(since, until)
         queue_size = await broker_inst.get_queue_size()
+        if admission:
+            await admission.refresh()
         
         uptime_seconds = (datetime.utcnow() - START_TIME).total_seconds()
         uptime_delta = timedelta(seconds=uptime_seconds)
@@ -357,7 +663,14 @@ async def get_stats(
             uptime_seconds=uptime_seconds,
             uptime_formatted=uptime_formatted,
             workers_active=len(worker_tasks),
-            queue_size=queue_size
+            queue_size=queue_size,
+            db_pools=database.pool_metrics(),
+            window=window,
+            dedup_cache=database.dedup_cache.metrics() if database.dedup_cache else None,
+            dedup_prefilter=await database.dedup_prefilter.metrics() if database.dedup_prefilter else None,
+            audit=database.audit_sink.metrics() if database.audit_sink else None,
+            broker=await broker_inst.broker_metrics(),
+            admission=admission.metrics() if admission else None
         )
     except Exception as e:
         logger.error(f"Failed to get stats: {e}")
@@ -374,8 +687,18 @@ async def clear_events(database: Database = Depends(get_database)):
             await conn.execute("DELETE FROM audit_log")
             await conn.execute("DELETE FROM processed_events")
             await conn.execute("DELETE FROM events")
+            await conn.execute("DELETE FROM topic_stats")
             await conn.execute("UPDATE statistics SET stat_value = 0")
         
+        if database.stats_buffer:
+            database.stats_buffer.discard()
+        if database.dedup_cache:
+            database.dedup_cache.clear()
+        if database.dedup_prefilter:
+            await database.dedup_prefilter.clear()
+        if database.audit_sink:
+            database.audit_sink.discard()
+        
         return {"success": True, "message": "All events cleared"}
     except Exception as e:
         logger.error(f"Failed to clear events: {e}")
@@ -392,7 +715,8 @@ async def http_exception_handler(request, exc):
             error=str(exc.detail),
             detail=None,
             timestamp=datetime.utcnow()
-        ).model_dump(mode='json')
+        ).model_dump(mode='json'),
+        headers=getattr(exc, 'headers', None)
     )
 
 
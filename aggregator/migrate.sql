@@ -0,0 +1,59 @@
+-- Schema upgrade untuk deployment lama (pg_data dibuat sebelum events dipartisi)
+-- Dijalankan oleh Database.migrate_schema() saat startup, dalam satu transaction
+-- sebelum init.sql, hanya jika schema masih versi lama. Aman dijalankan ulang:
+-- setiap langkah dicek lebih dulu terhadap catalog.
+--
+-- init.sql memakai CREATE ... IF NOT EXISTS sehingga tidak bisa mengubah tabel
+-- yang sudah ada. Script ini menyiapkan tabel lama agar init.sql bisa membuat
+-- schema baru di atasnya; row events lama dipindahkan setelah init.sql.
+
+-- events lama (tidak dipartisi, UNIQUE (topic, event_id)) disingkirkan sebagai
+-- events_legacy. Nama pkey dan sequence ikut diganti agar tidak bentrok dengan
+-- tabel partisi yang dibuat init.sql.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_class
+        WHERE oid = to_regclass('events') AND relkind = 'r'
+    ) THEN
+        ALTER TABLE events RENAME TO events_legacy;
+        ALTER INDEX IF EXISTS events_pkey RENAME TO events_legacy_pkey;
+        ALTER SEQUENCE IF EXISTS events_id_seq RENAME TO events_legacy_id_seq;
+    END IF;
+END
+$$;
+
+-- processed_events: kolom dedup window (key lama tidak pernah expire)
+DO $$
+BEGIN
+    IF to_regclass('processed_events') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'processed_events' AND column_name = 'expires_at'
+    ) THEN
+        ALTER TABLE processed_events ADD COLUMN expires_at TIMESTAMPTZ;
+    END IF;
+END
+$$;
+
+-- statistics: UNIQUE (stat_key) diganti striped counter UNIQUE (stat_key, slot).
+-- Nilai lama tetap berada di slot 0.
+DO $$
+BEGIN
+    IF to_regclass('statistics') IS NOT NULL AND NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'statistics' AND column_name = 'slot'
+    ) THEN
+        ALTER TABLE statistics ADD COLUMN slot INT NOT NULL DEFAULT 0;
+        ALTER TABLE statistics DROP CONSTRAINT IF EXISTS statistics_stat_key_key;
+        ALTER TABLE statistics ADD CONSTRAINT unique_stat_slot UNIQUE (stat_key, slot);
+    END IF;
+END
+$$;
+
+-- Fungsi lama: insert_event_idempotent memakai ON CONFLICT (topic, event_id)
+-- pada events, dan increment_stat 2 argumen membuat panggilan increment_stat(key, n)
+-- ambigu dengan versi slot-aware di init.sql
+DROP FUNCTION IF EXISTS insert_event_idempotent(VARCHAR, VARCHAR, TIMESTAMPTZ, VARCHAR, JSONB);
+DROP FUNCTION IF EXISTS increment_stat(VARCHAR, BIGINT);
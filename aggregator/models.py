@@ -87,6 +87,14 @@ class BatchPublishResponse(BaseModel):
     details: List[PublishResponse] = Field(default_factory=list)
 
 
+class QueueBatchResponse(BaseModel):
+    """Response model untuk POST /publish/queue/batch"""
+    success: bool
+    message: str
+    queued: int
+    received_at: Optional[datetime] = None
+
+
 class EventResponse(BaseModel):
     """Response model untuk single event dalam GET /events"""
     topic: str
@@ -104,6 +112,15 @@ class EventsListResponse(BaseModel):
     topic: Optional[str] = None
     count: int
     events: List[EventResponse]
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor untuk halaman berikutnya")
+
+
+class StatsWindow(BaseModel):
+    """Statistik unique event dalam time window (berdasarkan received_at)"""
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    unique_processed: int = Field(..., description="Unique events received in the window")
+    topic_counts: Dict[str, int] = Field(default_factory=dict, description="Event count per topic in the window")
 
 
 class StatsResponse(BaseModel):
@@ -120,6 +137,13 @@ class StatsResponse(BaseModel):
     uptime_formatted: str = Field(..., description="Human-readable uptime")
     workers_active: int = Field(default=0, description="Number of active workers")
     queue_size: int = Field(default=0, description="Current queue size")
+    db_pools: Dict[str, Dict[str, Any]] = Field(default_factory=dict, description="Connection pool metrics per role")
+    window: Optional[StatsWindow] = Field(None, description="Statistik window jika since/until diberikan")
+    dedup_cache: Optional[Dict[str, Any]] = Field(None, description="Ukuran dan hit/miss dedup cache")
+    dedup_prefilter: Optional[Dict[str, Any]] = Field(None, description="False positive dan memory dedup pre-filter")
+    audit: Optional[Dict[str, Any]] = Field(None, description="Jumlah audit record per operation dan buffer audit sink")
+    broker: Dict[str, Any] = Field(default_factory=dict, description="Metrik queue broker (pending/lag untuk stream)")
+    admission: Optional[Dict[str, Any]] = Field(None, description="State admission control (watermark queue depth dan pool wait)")
 
 
 class HealthResponse(BaseModel):
@@ -127,6 +151,8 @@ class HealthResponse(BaseModel):
     status: str
     database: str
     broker: str
+    replica: Optional[str] = None
+    admission: Optional[str] = None
     uptime_seconds: float
     version: str
 
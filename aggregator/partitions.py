@@ -0,0 +1,196 @@
+"""
+Log Aggregator - Queue Partition Assignment
+Membagi partisi queue ke worker di seluruh proses/container via Redis
+"""
+import hashlib
+import logging
+import time
+from typing import Dict, List
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+# Acquire/renew atau release lease partisi secara atomic. Mode "renew" hanya
+# memperpanjang lease yang masih dipegang (tidak mengambil lease yang expire).
+# KEYS: lease key
+# ARGV: consumer, ttl (ms), mode ("acquire"/"renew"/"release")
+LEASE_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if ARGV[3] == 'release' then
+    if holder == ARGV[1] then
+        redis.call('DEL', KEYS[1])
+    end
+    return 0
+end
+if holder == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not holder and ARGV[3] == 'acquire' then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+class PartitionAssigner:
+    """
+    Assignment partisi queue ke consumer (worker) dengan rebalancing.
+    
+    - Membership: sorted set <prefix>:members dengan score heartbeat terakhir;
+      member yang tidak heartbeat lebih dari member_ttl_seconds dibuang
+    - Assignment: rendezvous hashing (consumer, partisi), sehingga saat worker
+      join/leave hanya partisi milik worker tersebut yang berpindah
+    - Ownership: lease per partisi (<prefix>:lease:<n>). Worker hanya
+      mengkonsumsi partisi yang lease-nya dipegang; pemilik baru baru bisa
+      mengambil alih setelah pemilik lama melepas lease (setelah batch yang
+      sedang diproses selesai) atau lease expire (crash). Dengan begitu satu
+      partisi tidak pernah dikonsumsi dua worker sekaligus dan urutan FIFO
+      per partisi terjaga selama rebalancing.
+    - Selama batch diproses (bisa lebih lama dari TTL), worker memperpanjang
+      lease lewat renew() dari heartbeat background dan memeriksa holds()
+      sebelum commit; batch dari partisi yang lease-nya hilang tidak di-commit.
+    """
+    
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        key_prefix: str,
+        partitions: int,
+        heartbeat_seconds: float = 2.0,
+        member_ttl_seconds: float = 10.0
+    ):
+        self._redis = redis_client
+        self._members_key = f"{key_prefix}:members"
+        self._lease_prefix = f"{key_prefix}:lease"
+        self._partitions = partitions
+        self._heartbeat = heartbeat_seconds
+        self._ttl = member_ttl_seconds
+        self._lease = redis_client.register_script(LEASE_SCRIPT)
+        # consumer -> (partisi yang dimiliki, monotonic heartbeat terakhir)
+        self._owned: Dict[str, List[int]] = {}
+        self._last_heartbeat: Dict[str, float] = {}
+        # consumer -> monotonic batas lease terakhir yang pasti masih dipegang
+        self._valid_until: Dict[str, float] = {}
+    
+    @property
+    def heartbeat_seconds(self) -> float:
+        return self._heartbeat
+    
+    async def preload(self) -> None:
+        """Preload lease script agar heartbeat pertama tidak kena NOSCRIPT round trip"""
+        await self._redis.script_load(LEASE_SCRIPT)
+    
+    def _lease_key(self, partition: int) -> str:
+        return f"{self._lease_prefix}:{partition}"
+    
+    @staticmethod
+    def _weight(consumer: str, partition: int) -> int:
+        digest = hashlib.blake2b(f"{consumer}\x00{partition}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+    
+    def _assign(self, members: List[str], consumer: str) -> List[int]:
+        """Partisi yang menurut rendezvous hashing menjadi milik consumer"""
+        return [
+            partition for partition in range(self._partitions)
+            if max(members, key=lambda member: self._weight(member, partition)) == consumer
+        ]
+    
+    async def partitions_for(self, consumer: str) -> List[int]:
+        """
+        Partisi yang lease-nya dipegang consumer. Heartbeat, rebalancing dan
+        renewal lease dijalankan paling sering sekali per heartbeat_seconds.
+        """
+        last = self._last_heartbeat.get(consumer)
+        if last is not None and time.monotonic() - last < self._heartbeat:
+            return self._owned.get(consumer, [])
+        
+        started = time.monotonic()
+        self._last_heartbeat[consumer] = started
+        now = time.time()
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(self._members_key, {consumer: now})
+            pipe.zremrangebyscore(self._members_key, '-inf', now - self._ttl)
+            pipe.zrange(self._members_key, 0, -1)
+            members = (await pipe.execute())[2]
+        
+        desired = self._assign(members, consumer)
+        previous = self._owned.get(consumer, [])
+        ttl_ms = int(self._ttl * 1000)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for partition in desired:
+                await self._lease(
+                    keys=[self._lease_key(partition)],
+                    args=[consumer, ttl_ms, 'acquire'],
+                    client=pipe
+                )
+            for partition in previous:
+                if partition not in desired:
+                    await self._lease(
+                        keys=[self._lease_key(partition)],
+                        args=[consumer, ttl_ms, 'release'],
+                        client=pipe
+                    )
+            results = await pipe.execute()
+        
+        owned = [partition for partition, held in zip(desired, results) if held]
+        if owned != previous:
+            logger.info(f"Consumer {consumer} owns partitions {owned} ({len(members)} members)")
+        self._owned[consumer] = owned
+        self._valid_until[consumer] = started + self._ttl
+        return owned
+    
+    async def renew(self, consumer: str) -> List[int]:
+        """
+        Perpanjang membership dan lease partisi yang sedang dimiliki tanpa
+        rebalancing (dipanggil dari heartbeat selama batch diproses).
+        Partisi yang lease-nya sudah hilang dilepas dari ownership lokal.
+        """
+        started = time.monotonic()
+        owned = self._owned.get(consumer, [])
+        ttl_ms = int(self._ttl * 1000)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(self._members_key, {consumer: time.time()})
+            for partition in owned:
+                await self._lease(
+                    keys=[self._lease_key(partition)],
+                    args=[consumer, ttl_ms, 'renew'],
+                    client=pipe
+                )
+            results = (await pipe.execute())[1:]
+        
+        renewed = [partition for partition, held in zip(owned, results) if held]
+        if renewed != owned:
+            logger.warning(f"Consumer {consumer} lost leases for partitions {sorted(set(owned) - set(renewed))}")
+        self._owned[consumer] = renewed
+        self._valid_until[consumer] = started + self._ttl
+        return renewed
+    
+    def holds(self, consumer: str, partition: int) -> bool:
+        """True jika lease partisi dipegang consumer dan belum mungkin expire"""
+        return (
+            partition in self._owned.get(consumer, [])
+            and time.monotonic() < self._valid_until.get(consumer, 0.0)
+        )
+    
+    async def leave(self, consumer: str) -> None:
+        """Keluar dari membership dan lepas semua lease (worker berhenti)"""
+        owned = self._owned.pop(consumer, [])
+        self._last_heartbeat.pop(consumer, None)
+        self._valid_until.pop(consumer, None)
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zrem(self._members_key, consumer)
+            for partition in owned:
+                await self._lease(
+                    keys=[self._lease_key(partition)],
+                    args=[consumer, 0, 'release'],
+                    client=pipe
+                )
+            await pipe.execute()
+    
+    async def member_count(self) -> int:
+        """Jumlah consumer aktif di seluruh proses"""
+        return await self._redis.zcount(self._members_key, time.time() - self._ttl, '+inf')
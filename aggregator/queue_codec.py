@@ -0,0 +1,99 @@
+"""
+Log Aggregator - Queue Codec
+Wire format payload event di broker (JSON teks atau msgpack biner berversi)
+"""
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, Union
+
+import msgpack
+
+# Binary wire format: satu byte versi diikuti array msgpack
+#   [topic, event_id, timestamp (epoch mikrodetik UTC), source, payload, extra]
+# extra berisi field internal (_retries, _error, _failed_at). Byte versi tidak
+# pernah sama dengan awal JSON teks ('{'), sehingga message lama (JSON) dan
+# baru (biner) dapat berada di queue yang sama selama rollout. Event dengan
+# integer di luar jangkauan msgpack (64-bit) dikirim sebagai JSON teks.
+QUEUE_BINARY_V1 = 0x01
+
+ENCODINGS = ("json", "msgpack")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _to_epoch_us(value: datetime) -> int:
+    """Datetime ke epoch mikrodetik; datetime naive dianggap UTC"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _from_epoch_us(value: int) -> datetime:
+    return datetime.fromtimestamp(value // 1_000_000, tz=timezone.utc).replace(
+        microsecond=value % 1_000_000
+    )
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _msgpack_default(value: Any) -> Any:
+    # msgpack memanggil default untuk integer > 64-bit; jangan diubah menjadi string
+    if isinstance(value, int):
+        raise OverflowError(f"Integer out of msgpack range: {value}")
+    return _json_default(value)
+
+
+def encode(event: Dict[str, Any], encoding: str = "json") -> Union[str, bytes]:
+    """Encode event untuk queue sesuai encoding ("json" atau "msgpack")"""
+    if encoding != "msgpack":
+        return json.dumps(event, default=_json_default)
+    
+    timestamp = event['timestamp']
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    extra = {
+        key: value for key, value in event.items()
+        if key not in ('topic', 'event_id', 'timestamp', 'source', 'payload')
+    }
+    try:
+        return bytes((QUEUE_BINARY_V1,)) + msgpack.packb(
+            [
+                event['topic'],
+                event['event_id'],
+                _to_epoch_us(timestamp),
+                event['source'],
+                event.get('payload', {}),
+                extra
+            ],
+            default=_msgpack_default
+        )
+    except OverflowError:
+        # Integer > 64-bit (payload JSON valid) tidak bisa di-pack msgpack
+        return json.dumps(event, default=_json_default)
+
+
+def decode(data: Union[str, bytes]) -> Dict[str, Any]:
+    """
+    Decode payload queue dalam format apa pun (JSON teks atau biner berversi).
+    Timestamp biner dikembalikan sebagai datetime UTC, JSON sebagai string ISO.
+    """
+    if isinstance(data, str) or data[:1] == b'{':
+        return json.loads(data)
+    if data[:1] != bytes((QUEUE_BINARY_V1,)):
+        raise ValueError(f"Unsupported queue message version: {data[:1]!r}")
+    
+    topic, event_id, timestamp, source, payload, extra = msgpack.unpackb(data[1:])
+    event = {
+        'topic': topic,
+        'event_id': event_id,
+        'timestamp': _from_epoch_us(timestamp),
+        'source': source,
+        'payload': payload
+    }
+    event.update(extra)
+    return event
@@ -0,0 +1,142 @@
+"""
+Log Aggregator - Write-Behind Statistics Buffer
+Mengakumulasi counter statistics di memory dan flush ke PostgreSQL secara periodik
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STAT_KEYS = ('received', 'unique_processed', 'duplicate_dropped')
+
+# topic -> (unique_count, duplicate_count)
+TopicDeltas = Dict[str, Tuple[int, int]]
+
+
+class StatsBuffer:
+    """
+    Write-behind accumulator untuk tabel statistics.
+    
+    Counter received/unique_processed/duplicate_dropped dan counter per topic
+    ditambahkan di memory setelah transaction event commit, lalu di-flush dalam
+    satu statement setiap flush_interval_ms atau ketika jumlah event pending
+    mencapai flush_max_events.
+    Lock yang sama dipakai oleh flush dan snapshot sehingga pembacaan
+    (persisted + pending) exact selama persisted dibaca dari primary; dari
+    read replica counter dapat tertinggal sebesar lag replica.
+    """
+    
+    def __init__(
+        self,
+        flush_func: Callable[[int, int, int, TopicDeltas], Awaitable[None]],
+        flush_interval_ms: int = 1000,
+        flush_max_events: int = 1000
+    ):
+        self._flush_func = flush_func
+        self._flush_interval = flush_interval_ms / 1000
+        self._flush_max_events = flush_max_events
+        self._pending: Dict[str, int] = dict.fromkeys(STAT_KEYS, 0)
+        self._pending_topics: Dict[str, list] = {}
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        """Start background flush loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+            logger.info("Statistics write-behind buffer started")
+    
+    async def stop(self) -> None:
+        """Stop flush loop dan flush sisa delta"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info("Statistics write-behind buffer stopped")
+    
+    def add(
+        self,
+        received: int,
+        unique_processed: int,
+        duplicate_dropped: int,
+        topic_deltas: TopicDeltas
+    ) -> None:
+        """Tambahkan delta counter (dipanggil setelah transaction commit)"""
+        self._pending['received'] += received
+        self._pending['unique_processed'] += unique_processed
+        self._pending['duplicate_dropped'] += duplicate_dropped
+        self._merge_topics(topic_deltas)
+        
+        if self._pending['received'] >= self._flush_max_events:
+            self._wake.set()
+    
+    def discard(self) -> None:
+        """Buang delta yang belum di-flush (misalnya setelah statistics di-reset)"""
+        self._pending = dict.fromkeys(STAT_KEYS, 0)
+        self._pending_topics = {}
+    
+    async def flush(self) -> None:
+        """Flush delta pending ke database dalam satu statement"""
+        async with self._lock:
+            pending = self._pending
+            pending_topics = {topic: tuple(d) for topic, d in self._pending_topics.items()}
+            if not any(pending.values()):
+                return
+            self.discard()
+            
+            try:
+                await self._flush_func(
+                    pending['received'],
+                    pending['unique_processed'],
+                    pending['duplicate_dropped'],
+                    pending_topics
+                )
+            except Exception as e:
+                # Kembalikan delta agar tidak hilang, dicoba lagi pada flush berikutnya
+                for key in STAT_KEYS:
+                    self._pending[key] += pending[key]
+                self._merge_topics(pending_topics)
+                logger.error(f"Failed to flush statistics: {e}")
+    
+    async def snapshot(
+        self,
+        read_func: Callable[[], Awaitable[Tuple[Dict[str, int], Dict[str, int]]]]
+    ) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """
+        Baca counter persisted lalu tambahkan delta lokal yang belum di-flush.
+        Dijalankan di bawah lock flush agar tidak ada delta yang terhitung dua kali.
+        
+        Returns:
+            Tuple[dict, dict]: (counters, unique count per topic)
+        """
+        async with self._lock:
+            persisted, topic_counts = await read_func()
+            counters = {
+                key: persisted.get(key, 0) + self._pending[key]
+                for key in STAT_KEYS
+            }
+            topic_counts = dict(topic_counts)
+            for topic, (unique_count, _) in self._pending_topics.items():
+                topic_counts[topic] = topic_counts.get(topic, 0) + unique_count
+            return counters, topic_counts
+    
+    def _merge_topics(self, topic_deltas: TopicDeltas) -> None:
+        for topic, (unique_count, duplicate_count) in topic_deltas.items():
+            delta = self._pending_topics.setdefault(topic, [0, 0])
+            delta[0] += unique_count
+            delta[1] += duplicate_count
+    
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
@@ -0,0 +1,318 @@
+"""
+Log Aggregator - Queue Worker Runtime
+Worker queue (in-process untuk API server, atau standalone multi-process)
+
+Standalone (tanpa HTTP server):
+    python worker.py
+
+Supervisor menjalankan WORKER_PROCESSES proses (default: jumlah core), masing-
+masing dengan event loop, pool database dan koneksi Redis sendiri, dan
+WORKER_COUNT worker task per proses. Proses yang mati di-restart dengan
+backoff; jika restart melebihi WORKER_RESTART_MAX dalam
+WORKER_RESTART_WINDOW_SECONDS, supervisor berhenti dengan exit code 1 agar
+orchestrator (Docker restart policy) mengambil alih. SIGTERM/SIGINT memicu
+graceful shutdown: worker menyelesaikan batch yang sedang berjalan, statistics
+di-flush, lalu koneksi ditutup.
+"""
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from config import get_settings
+from database import db
+from broker import broker
+from dedup_prefilter import DedupPrefilter
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Worker tasks
+worker_tasks: List[asyncio.Task] = []
+retry_mover_task: Optional[asyncio.Task] = None
+
+WORKER_STOP_GRACE_SECONDS = 5.0
+
+
+def queue_event_to_record(event_data: dict) -> dict:
+    """Konversi event dari queue menjadi record untuk insert database"""
+    return {
+        'topic': event_data['topic'],
+        'event_id': event_data['event_id'],
+        'timestamp': datetime.fromisoformat(event_data['timestamp'].replace('Z', '+00:00'))
+            if isinstance(event_data['timestamp'], str) else event_data['timestamp'],
+        'source': event_data['source'],
+        'payload': event_data.get('payload', {})
+    }
+
+
+async def process_event_from_queue(event_data: dict) -> None:
+    """
+    Process event from queue with idempotent insert.
+    This function is called by background workers.
+    
+    Tanpa retry in-process: event yang gagal langsung dijadwalkan ulang di
+    retry sorted set broker, sehingga worker tidak tertahan oleh backoff.
+    """
+    try:
+        await db.insert_event_once(
+            **queue_event_to_record(event_data),
+            worker_id=f"worker-{os.getpid()}"
+        )
+    except Exception as e:
+        logger.error(f"Error processing event from queue: {e}")
+        raise
+
+
+async def process_events_from_queue(events_data: List[dict]) -> None:
+    """
+    Process micro-batch event dari queue dalam satu transaction batch insert.
+    Jika gagal, worker memproses ulang event satu per satu (poison message
+    tidak menggagalkan event lain di batch).
+    """
+    await db.batch_insert_events_atomic(
+        [queue_event_to_record(event_data) for event_data in events_data],
+        worker_id=f"worker-{os.getpid()}"
+    )
+
+
+def attach_dedup_prefilter() -> None:
+    """Pasang dedup pre-filter (memakai koneksi Redis broker) jika diaktifkan"""
+    if settings.dedup_prefilter_enabled:
+        db.dedup_prefilter = DedupPrefilter(
+            broker.redis,
+            key_prefix=settings.dedup_prefilter_key,
+            bits=settings.dedup_prefilter_bits,
+            hashes=settings.dedup_prefilter_hashes,
+            bucket_seconds=settings.dedup_prefilter_bucket_seconds
+        )
+
+
+async def start_workers(count: int = 4) -> None:
+    """Start background worker tasks"""
+    global retry_mover_task
+    
+    retry_mover_task = asyncio.create_task(broker.run_retry_mover())
+    
+    for i in range(count):
+        task = asyncio.create_task(
+            broker.start_worker(
+                process_event_from_queue,
+                f"worker-{i+1}",
+                batch_func=process_events_from_queue
+            )
+        )
+        worker_tasks.append(task)
+    
+    logger.info(f"Started {count} background workers")
+
+
+async def stop_workers() -> None:
+    """Stop all background workers"""
+    global retry_mover_task
+    
+    broker.stop_workers()
+    
+    # Beri waktu worker menyelesaikan read/commit yang sedang berjalan (read
+    # broker memblok maksimal 1 detik) sebelum dibatalkan paksa
+    if worker_tasks:
+        await asyncio.wait(worker_tasks, timeout=WORKER_STOP_GRACE_SECONDS)
+    
+    for task in worker_tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    
+    worker_tasks.clear()
+    
+    if retry_mover_task:
+        retry_mover_task.cancel()
+        try:
+            await retry_mover_task
+        except asyncio.CancelledError:
+            pass
+        retry_mover_task = None
+    logger.info("All workers stopped")
+
+
+# ==================== Standalone Runtime ====================
+
+def configure_logging() -> None:
+    """
+    Konfigurasi logging proses standalone (supervisor dan proses anak).
+    Tidak dijalankan saat import, sehingga API server yang meng-import
+    modul ini tetap memakai konfigurasi logging-nya sendiri.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+
+async def run_worker_runtime() -> None:
+    """Event loop satu proses worker: connect, drain queue sampai diberi sinyal stop"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    
+    await db.connect()
+    await broker.connect()
+    try:
+        attach_dedup_prefilter()
+        await start_workers(settings.worker_count)
+        await stop.wait()
+        logger.info(f"Worker process {os.getpid()} stopping...")
+    finally:
+        await stop_workers()
+        # Flush delta statistics write-behind sebelum pool ditutup
+        await db.flush_statistics()
+        await broker.disconnect()
+        await db.disconnect()
+
+
+def run_worker_process(slot: int) -> None:
+    """Entry point proses anak supervisor"""
+    # Proses anak spawn tidak menjalankan main(), logging dikonfigurasi ulang
+    configure_logging()
+    logger.info(f"Worker process {slot} started (pid {os.getpid()})")
+    asyncio.run(run_worker_runtime())
+
+
+class WorkerSupervisor:
+    """
+    Menjalankan dan mengawasi proses worker.
+    
+    Setiap slot proses punya budget restart sendiri: restart ke-n menunggu
+    restart_backoff_seconds * 2^(n-1), dan lebih dari restart_max restart
+    dalam restart_window_seconds menghentikan supervisor (exit code 1).
+    """
+    
+    def __init__(
+        self,
+        processes: int,
+        restart_max: int = 5,
+        restart_window_seconds: float = 60.0,
+        restart_backoff_seconds: float = 1.0,
+        shutdown_timeout_seconds: float = 15.0
+    ):
+        # spawn: proses anak tidak mewarisi event loop / koneksi induk
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = processes
+        self._restart_max = restart_max
+        self._restart_window = restart_window_seconds
+        self._restart_backoff = restart_backoff_seconds
+        self._shutdown_timeout = shutdown_timeout_seconds
+        self._children: Dict[int, multiprocessing.process.BaseProcess] = {}
+        self._restarts: Dict[int, Deque[float]] = {slot: deque() for slot in range(processes)}
+        # slot -> monotonic waktu restart dijadwalkan
+        self._pending: Dict[int, float] = {}
+        self._stopping = False
+    
+    def _spawn(self, slot: int) -> None:
+        process = self._context.Process(
+            target=run_worker_process,
+            args=(slot,),
+            name=f"aggregator-worker-{slot}"
+        )
+        process.start()
+        self._children[slot] = process
+    
+    def _request_stop(self, signum, frame) -> None:
+        logger.info(f"Supervisor received {signal.Signals(signum).name}, shutting down workers")
+        self._stopping = True
+    
+    def _handle_exit(self, slot: int, exitcode: int) -> bool:
+        """Jadwalkan restart slot; False jika budget restart habis"""
+        now = time.monotonic()
+        restarts = self._restarts[slot]
+        while restarts and restarts[0] < now - self._restart_window:
+            restarts.popleft()
+        if len(restarts) >= self._restart_max:
+            logger.error(
+                f"Worker process {slot} exited with code {exitcode}; "
+                f"{len(restarts)} restarts in {self._restart_window:.0f}s, giving up"
+            )
+            return False
+        
+        delay = self._restart_backoff * (2 ** len(restarts))
+        restarts.append(now)
+        self._pending[slot] = now + delay
+        logger.warning(f"Worker process {slot} exited with code {exitcode}; restarting in {delay:.1f}s")
+        return True
+    
+    def _shutdown(self) -> None:
+        """SIGTERM ke semua proses (graceful), kill jika melewati timeout"""
+        for process in self._children.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self._shutdown_timeout
+        for slot, process in self._children.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker process {slot} did not stop in time, killing")
+                process.kill()
+                process.join()
+        self._children.clear()
+    
+    def run(self) -> int:
+        """Jalankan supervisor sampai SIGTERM/SIGINT; return exit code"""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        
+        for slot in range(self._processes):
+            self._spawn(slot)
+        logger.info(
+            f"Supervisor started {self._processes} worker processes "
+            f"x {settings.worker_count} workers"
+        )
+        
+        exit_code = 0
+        while not self._stopping:
+            multiprocessing.connection.wait(
+                [process.sentinel for process in self._children.values()],
+                timeout=0.5
+            )
+            for slot, process in list(self._children.items()):
+                if process.exitcode is None or self._stopping:
+                    continue
+                del self._children[slot]
+                if not self._handle_exit(slot, process.exitcode):
+                    self._stopping = True
+                    exit_code = 1
+            
+            now = time.monotonic()
+            for slot, due in list(self._pending.items()):
+                if due <= now and not self._stopping:
+                    del self._pending[slot]
+                    self._spawn(slot)
+        
+        self._shutdown()
+        logger.info("Supervisor stopped")
+        return exit_code
+
+
+def main() -> None:
+    configure_logging()
+    supervisor = WorkerSupervisor(
+        processes=settings.worker_processes or os.cpu_count() or 1,
+        restart_max=settings.worker_restart_max,
+        restart_window_seconds=settings.worker_restart_window_seconds,
+        restart_backoff_seconds=settings.worker_restart_backoff_seconds,
+        shutdown_timeout_seconds=settings.worker_shutdown_timeout_seconds
+    )
+    sys.exit(supervisor.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark: wire format payload queue (JSON vs msgpack)
+
+Membandingkan encoding payload event di broker:
+- bytes per event (ukuran payload yang disimpan Redis)
+- encode events/s (sisi publisher/API)
+- decode events/s per worker, termasuk konversi ke record database
+  (queue_event_to_record: JSON harus parse timestamp ISO)
+- opsional (--redis): memory Redis per event di list dan throughput drain
+  satu worker (BRPOP + RPOP batch + decode) terhadap Redis sungguhan
+
+Event dibuat dengan bentuk yang sama seperti publisher (payload log dengan
+level, message, request_id, user_id, duration_ms dan metadata).
+
+Usage:
+    python benchmarks/bench_queue_codec.py --events 200000
+    BROKER_URL=redis://localhost:6379/0 python benchmarks/bench_queue_codec.py --redis
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import redis.asyncio as redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "aggregator"))
+
+import queue_codec  # noqa: E402
+from config import get_settings  # noqa: E402
+from worker import queue_event_to_record  # noqa: E402
+
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+MESSAGES = [
+    "User login successful",
+    "Database query executed",
+    "Cache miss for key",
+    "Request processed",
+    "Payment transaction completed",
+]
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_events(count: int):
+    """Event seperti yang di-enqueue oleh POST /publish/queue (timestamp datetime)"""
+    rng = random.Random(42)
+    return [
+        {
+            "topic": f"app-logs-{i % 10}",
+            "event_id": f"evt-{uuid.UUID(int=rng.getrandbits(128))}",
+            "timestamp": START + timedelta(microseconds=rng.randrange(10 ** 12)),
+            "source": f"service-{i % 5}",
+            "payload": {
+                "level": rng.choice(LEVELS),
+                "message": rng.choice(MESSAGES),
+                "request_id": uuid.UUID(int=rng.getrandbits(128)).hex[:8],
+                "user_id": f"user-{rng.randint(1000, 9999)}",
+                "duration_ms": rng.randint(1, 500),
+                "metadata": {"version": "1.0.0", "environment": "production"},
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def rate(count: int, func) -> float:
+    started = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - started)
+
+
+def bench_codec(events, encoding: str) -> dict:
+    encoded = [queue_codec.encode(event, encoding) for event in events]
+    return {
+        "bytes/event": sum(len(data) for data in encoded) / len(encoded),
+        "encode ev/s": rate(len(events), lambda: [queue_codec.encode(e, encoding) for e in events]),
+        # Worker menerima bytes dari Redis (client tanpa decode_responses)
+        "decode ev/s": rate(len(events), lambda: [
+            queue_event_to_record(queue_codec.decode(data if isinstance(data, bytes) else data.encode()))
+            for data in encoded
+        ]),
+    }
+
+
+async def bench_redis(events, encoding: str, batch: int) -> dict:
+    """Memory per event di list Redis dan throughput drain satu worker"""
+    client = redis.from_url(get_settings().broker_url)
+    key = f"bench_queue_codec:{encoding}"
+    try:
+        await client.delete(key)
+        encoded = [queue_codec.encode(event, encoding) for event in events]
+        for first in range(0, len(encoded), 1000):
+            await client.lpush(key, *encoded[first:first + 1000])
+        
+        try:
+            memory = await client.memory_usage(key, samples=0) / len(events)
+        except redis.ResponseError:
+            memory = float("nan")  # MEMORY USAGE tidak didukung server
+        
+        drained = 0
+        started = time.perf_counter()
+        while drained < len(events):
+            result = await client.brpop([key], timeout=1)
+            if not result:
+                break
+            raw = [result[1]] + (await client.rpop(key, batch - 1) or [])
+            for data in raw:
+                queue_event_to_record(queue_codec.decode(data))
+            drained += len(raw)
+        return {
+            "redis bytes/event": memory,
+            "drain ev/s": drained / (time.perf_counter() - started),
+        }
+    finally:
+        await client.delete(key)
+        await client.aclose()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--redis", action="store_true", help="Ukur juga memory dan drain di Redis")
+    parser.add_argument("--batch", type=int, default=100, help="Event per pop worker (BATCH_SIZE)")
+    args = parser.parse_args()
+    
+    events = make_events(args.events)
+    results = {}
+    for encoding in queue_codec.ENCODINGS:
+        results[encoding] = bench_codec(events, encoding)
+        if args.redis:
+            results[encoding].update(await bench_redis(events, encoding, args.batch))
+    
+    print(f"{args.events} events, single process")
+    print(f"{'':>20}" + "".join(f"{encoding:>14}" for encoding in results))
+    for metric in results["json"]:
+        print(f"{metric:>20}" + "".join(f"{results[e][metric]:>14.1f}" for e in results))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
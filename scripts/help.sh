@@ -29,6 +29,9 @@ echo ""
 echo "  Check stats:"
 echo "    curl http://localhost:8080/stats"
 echo ""
+echo "  Backfill per-topic counters (one-off, for existing data):"
+echo "    docker compose exec storage psql -U aggregator_user -d logaggregator -c \"SELECT backfill_topic_stats();\""
+echo ""
 echo "  Run tests:"
 echo "    pip install -r tests/requirements.txt"
 echo "    pytest tests/test_aggregator.py -v"